@@ -0,0 +1,186 @@
+# Copyright (c) 2026, NDV and contributors
+# For license information, please see license.txt
+
+"""
+Cold archive of Biometric Attendance Log rows in compressed private Files per month.
+
+Each archive part is gzip'd JSON Lines, one line per log with its day summary and punches,
+so closed months stay available for labour audits and the monthly report without living in
+the hot tables. Logs that reach a month after it was archived go to a further part; parts
+are merged back by employee and day when read.
+"""
+
+import gzip
+import json
+
+import frappe
+from frappe.utils import add_months, get_first_day, get_last_day, getdate
+
+from biometric_integration.biometric_integration.attendance_compute import summarize_punches, time_to_seconds
+
+ARCHIVE_ATTACHED_TO = "Biometric Integration Settings"
+
+
+def _get_archive_files(file_name_pattern):
+    return frappe.get_all("File", filters={
+        "attached_to_doctype": ARCHIVE_ATTACHED_TO,
+        "attached_to_name": ARCHIVE_ATTACHED_TO,
+        "file_name": ["like", file_name_pattern],
+    }, fields=["name", "file_name"], order_by="creation")
+
+
+def get_archive_files(year, month):
+    """Names of the month's archive parts, oldest first."""
+    return [file.name for file in _get_archive_files(f"attendance-archive-{int(year)}-{int(month):02d}-%.jsonl.gz")]
+
+
+def get_archived_months():
+    """(year, month) of every archived month."""
+    months = set()
+    for file in _get_archive_files("attendance-archive-%.jsonl.gz"):
+        year, month = file.file_name.split("-")[2:4]
+        months.add((int(year), int(month)))
+
+    return sorted(months)
+
+
+def _read_archive_file(file_name):
+    with gzip.open(frappe.get_doc("File", file_name).get_full_path(), "rt", encoding="utf-8") as archive:
+        return [json.loads(line) for line in archive if line.strip()]
+
+
+def read_archived_month(year, month):
+    """The archived log rows of a month, or None if it was never archived."""
+    files = get_archive_files(year, month)
+    if not files:
+        return None
+
+    rows = []
+    for file_name in files:
+        rows = _merge_rows(rows, _read_archive_file(file_name))
+    return rows
+
+
+def _read_month_logs(year, month):
+    from_date = getdate(f"{int(year)}-{int(month):02d}-01")
+    params = {"from_date": from_date, "to_date": get_last_day(from_date)}
+
+    logs = frappe.db.sql("""
+        SELECT name, employee_no, employee_name, event_date
+        FROM `tabBiometric Attendance Log`
+        WHERE event_date BETWEEN %(from_date)s AND %(to_date)s
+        ORDER BY event_date, employee_no
+    """, params, as_dict=True)
+
+    punches = {}
+    for punch in frappe.db.sql("""
+        SELECT p.parent, p.punch_time, p.punch_type
+        FROM `tabBiometric Attendance Punch Table` p
+        INNER JOIN `tabBiometric Attendance Log` l ON l.name = p.parent
+        WHERE l.event_date BETWEEN %(from_date)s AND %(to_date)s
+        ORDER BY p.parent, p.punch_time
+    """, params, as_dict=True):
+        punches.setdefault(punch.parent, []).append([str(punch.punch_time), punch.punch_type])
+
+    return [
+        {
+            "employee_no": log.employee_no,
+            "employee_name": log.employee_name,
+            "event_date": str(log.event_date),
+            "punches": punches.get(log.name, []),
+        }
+        for log in logs
+    ]
+
+
+def _merge_rows(archived, rows):
+    # A day split across parts (punches synced after its month was archived) becomes one row again
+    by_key = {(row["employee_no"], row["event_date"]): row for row in archived}
+    for row in rows:
+        existing = by_key.get((row["employee_no"], row["event_date"]))
+        if existing is None:
+            by_key[(row["employee_no"], row["event_date"])] = row
+            continue
+
+        punches = {punch[0]: punch for punch in existing["punches"]}
+        for punch in row["punches"]:
+            punches.setdefault(punch[0], punch)
+        existing["punches"] = list(punches.values())
+        existing["employee_name"] = existing.get("employee_name") or row.get("employee_name")
+
+    merged = sorted(by_key.values(), key=lambda row: (row["event_date"], str(row["employee_no"])))
+    for row in merged:
+        row["punches"].sort(key=lambda punch: time_to_seconds(punch[0]))
+        summary = summarize_punches([punch[0] for punch in row["punches"]])
+        row["worked_minutes"] = summary.worked_minutes
+        row["odd_punches"] = summary.odd_punches
+
+    return merged
+
+
+def write_month_archive(year, month):
+    """
+    Save every log of the month still in the hot tables as a new private gzip'd JSONL part.
+
+    Returns (File name, number of logs archived), or (None, 0) when the month has no logs.
+    """
+    rows = _merge_rows([], _read_month_logs(year, month))
+    if not rows:
+        return None, 0
+
+    part = len(get_archive_files(year, month)) + 1
+
+    content = gzip.compress(
+        "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows).encode()
+    )
+
+    file = frappe.get_doc({
+        "doctype": "File",
+        "file_name": f"attendance-archive-{int(year)}-{int(month):02d}-{part}.jsonl.gz",
+        "is_private": 1,
+        "content": content,
+        "attached_to_doctype": ARCHIVE_ATTACHED_TO,
+        "attached_to_name": ARCHIVE_ATTACHED_TO,
+    })
+    file.save(ignore_permissions=True)
+    return file.name, len(rows)
+
+
+def get_closed_months(before_date):
+    """(year, month) of every month with logs that ends before the month of `before_date`."""
+    return [
+        (int(row.year), int(row.month))
+        for row in frappe.db.sql("""
+            SELECT DISTINCT YEAR(event_date) AS year, MONTH(event_date) AS month
+            FROM `tabBiometric Attendance Log`
+            WHERE event_date < %(before)s
+            ORDER BY year, month
+        """, {"before": get_first_day(before_date)}, as_dict=True)
+    ]
+
+
+def get_archived_day_punch_types(employee_nos, from_date, to_date):
+    """{punch seconds: punch type} per (employee_no, event_date) from the archives of every month in the range."""
+    from_date, to_date = getdate(from_date), getdate(to_date)
+    employee_nos = {str(employee_no) for employee_no in employee_nos}
+    days = {}
+
+    month = get_first_day(from_date)
+    while month <= to_date:
+        for row in read_archived_month(month.year, month.month) or []:
+            event_date = getdate(row["event_date"])
+            if str(row["employee_no"]) in employee_nos and from_date <= event_date <= to_date:
+                days.setdefault((str(row["employee_no"]), event_date), {}).update(
+                    (time_to_seconds(punch[0]), punch[1]) for punch in row["punches"]
+                )
+        month = add_months(month, 1)
+
+    return days
+
+
+def get_archived_day_punches(employee_nos, from_date, to_date):
+    """Punch seconds per (employee_no, event_date) from the archives of every month in the range."""
+    return {
+        key: set(punch_types)
+        for key, punch_types in get_archived_day_punch_types(employee_nos, from_date, to_date).items()
+    }
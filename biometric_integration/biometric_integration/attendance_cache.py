@@ -0,0 +1,34 @@
+# Copyright (c) 2026, NDV and contributors
+# For license information, please see license.txt
+
+"""
+Redis cache of the monthly attendance grids.
+
+One hash per month holds every variant of the grid built for it, so a punch change, a purge
+or an archive run drops the whole month with a single delete.
+"""
+
+import frappe
+
+MONTH_CACHE_TTL = 24 * 60 * 60
+
+
+def get_month_cache_key(year, month):
+    return f"biometric_monthly_report|{int(year)}-{int(month):02d}"
+
+
+def get_cached_month(year, month, field):
+    """The cached value of one variant of a month grid, or None."""
+    return frappe.cache.hget(get_month_cache_key(year, month), field)
+
+
+def set_cached_month(year, month, field, value):
+    cache_key = get_month_cache_key(year, month)
+    frappe.cache.hset(cache_key, field, value)
+    frappe.cache.expire(frappe.cache.make_key(cache_key), MONTH_CACHE_TTL)
+
+
+def clear_month_cache(dates):
+    """Drop the cached monthly grids of every month the given dates fall in."""
+    for year, month in {(date.year, date.month) for date in dates}:
+        frappe.cache.delete_value(get_month_cache_key(year, month))
@@ -0,0 +1,132 @@
+# Copyright (c) 2026, NDV and contributors
+# For license information, please see license.txt
+
+"""
+Shared punch arithmetic for the attendance log and every report.
+
+Punches of many employee-days are packed into flat `array` buffers of integer seconds with
+an offsets index, so pair durations, odd flags and first/last punches are worked out with
+strided slices over machine integers instead of walking dicts of timedeltas pair by pair.
+"""
+
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+DaySummary = namedtuple("DaySummary", ["worked_minutes", "punch_count", "odd_punches", "first_punch", "last_punch"])
+
+
+def time_to_seconds(value):
+    """Normalise a punch time (time, timedelta or "HH:MM:SS" string) to seconds."""
+    if isinstance(value, timedelta):
+        return int(value.total_seconds())
+    if isinstance(value, str):
+        value = datetime.strptime(value.split(".")[0], "%H:%M:%S").time()
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def seconds_to_time(seconds):
+    return (datetime.min + timedelta(seconds=seconds)).time()
+
+
+def format_minutes_to_hhmm(minutes):
+    hours, mins = divmod(minutes, 60)
+    return f"{hours:02}:{mins:02}"
+
+
+def format_decimal_hours(minutes):
+    return f"{minutes // 60 + minutes % 60 / 60:.4f}"
+
+
+class PunchDays:
+    """
+    Punch times of many days, keyed by any hashable (a log name, (employee_no, date), ...).
+
+    Days are appended in order; each day's punches must already be sorted by time.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.offsets = array("l", [0])
+        self.seconds = array("l")
+
+    @classmethod
+    def from_rows(cls, rows, key, time_field="punch_time"):
+        """Pack query rows ordered by day and punch time; `key(row)` names each row's day."""
+        days = cls()
+        current = object()
+        for row in rows:
+            row_key = key(row)
+            if row_key != current:
+                if days.keys:
+                    days.offsets.append(len(days.seconds))
+                days.keys.append(row_key)
+                current = row_key
+            days.seconds.append(time_to_seconds(row[time_field]))
+
+        if days.keys:
+            days.offsets.append(len(days.seconds))
+        return days
+
+    def add_day(self, key, punch_times):
+        self.keys.append(key)
+        self.seconds.extend(time_to_seconds(value) for value in punch_times)
+        self.offsets.append(len(self.seconds))
+
+    def summaries(self):
+        """
+        Return {key: DaySummary} for every day.
+
+        Worked minutes sum whole-minute differences of consecutive in-out pairs; a trailing
+        odd punch is left out of the pairs and flagged.
+        """
+        minutes = array("l", (value // 60 for value in self.seconds))
+        offsets = self.offsets
+        result = {}
+
+        for i, key in enumerate(self.keys):
+            start, end = offsets[i], offsets[i + 1]
+            count = end - start
+            paired_end = start + count - count % 2
+
+            result[key] = DaySummary(
+                worked_minutes=sum(minutes[start + 1:paired_end:2]) - sum(minutes[start:paired_end:2]),
+                punch_count=count,
+                odd_punches=count % 2,
+                first_punch=self.seconds[start] if count else None,
+                last_punch=self.seconds[end - 1] if count else None,
+            )
+
+        return result
+
+
+def summarize_punches(punch_times):
+    """DaySummary of a single day's sorted punch times."""
+    days = PunchDays()
+    days.add_day(None, punch_times)
+    return days.summaries()[None]
+
+
+def punch_insert_idx(existing, added, existing_idx=None):
+    """
+    idx of each new punch when the sorted seconds `added` join a day's sorted `existing`
+    punches. `existing_idx` are the stored idx of the existing punches in the same order,
+    1..n when omitted; gaps left by deleted rows are fine as long as they rise with time.
+    """
+    if existing_idx is None:
+        existing_idx = range(1, len(existing) + 1)
+
+    # The stored idx of the punch before it plus the new ones placed up to and including it
+    result = []
+    for position, seconds in enumerate(added, 1):
+        before = bisect_left(existing, seconds)
+        result.append((existing_idx[before - 1] if before else 0) + position)
+    return result
+
+
+def punch_idx_shifts(existing, added):
+    """New punches landing before an existing one; each moves every later existing punch up one idx."""
+    if not existing:
+        return []
+    return [seconds for seconds in added if seconds < existing[-1]]
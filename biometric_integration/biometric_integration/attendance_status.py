@@ -0,0 +1,249 @@
+# Copyright (c) 2026, NDV and contributors
+# For license information, please see license.txt
+
+"""
+Present / absent / leave classification of employees over a date range.
+
+Everything is read in one joined query (Employee against the stored day summaries of
+Biometric Attendance Log and against Biometric Leave Log), then every employee-day is
+classified in one step, so the daily report and any multi-day absence view share the
+same rules.
+"""
+
+from datetime import timedelta
+
+import frappe
+from frappe.utils import date_diff, getdate
+
+SHIFT_END_TIMES = {
+    "Full-time": 19 * 3600 + 40 * 60,  # 7:40 PM = 19:40
+    "Mid Shift": 19 * 3600,              # 7:00 PM = 19:00
+    "Part-time": 18 * 3600               # 6:00 PM = 18:00
+}
+LEAVE_TOLERANCE_SECONDS = 15 * 60
+SHIFT_END_TOLERANCE_SECONDS = 30 * 60
+
+
+def parse_time_to_seconds(val):
+    if val is None:
+        return None
+    if hasattr(val, 'total_seconds'):
+        return val.total_seconds()
+    # string like "19:40:00" or "7:40:00"
+    try:
+        parts = str(val).split(":")
+        return int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
+    except Exception:
+        return None
+
+
+def _fmt(total_seconds):
+    h, m = divmod(int(total_seconds / 60), 60)
+    return f"{h:02}:{m:02}"
+
+
+def check_early_leave_present(first_punch_time, last_punch_time, leave_entry, employment_type):
+    """
+    For present employees only.
+    Checks leave_to against first punch, leave_from against last punch.
+    Returns:
+      "1"         - punch matches logged leave time within +-15 min (or came before leave_to)
+      "2"         - no leave log but left before shift end (unlogged early leave)
+      "0 (HH:MM)" - left before logged leave_from time, or came after leave_to
+      ""          - full day worked, or no employment_type
+    """
+    expected_end = SHIFT_END_TIMES.get(employment_type)
+
+    # If employment_type is not set or not recognised, give no flag
+    if expected_end is None:
+        return ""
+
+    if leave_entry is None:
+        # No leave log — check if last punch is before shift end
+        if last_punch_time is None:
+            return ""
+        last_punch_seconds = last_punch_time.total_seconds()
+        if last_punch_seconds < (expected_end - SHIFT_END_TOLERANCE_SECONDS):
+            return "2"
+        return ""
+
+    leave_from_seconds = leave_entry.get("leave_from")
+    leave_to_seconds = leave_entry.get("leave_to")
+
+    result_leave_to = None
+    result_leave_from = None
+
+    # Check leave_to against first punch
+    if leave_to_seconds is not None:
+        if first_punch_time is not None:
+            first_punch_seconds = first_punch_time.total_seconds()
+            diff = first_punch_seconds - leave_to_seconds
+            # Came before or within +-15 min of leave_to -> good -> "1"
+            if diff <= LEAVE_TOLERANCE_SECONDS:
+                result_leave_to = "1"
+            else:
+                # Came after leave_to by more than 15 min
+                result_leave_to = f"0 ({_fmt(leave_to_seconds)})"
+
+    # Check leave_from against last punch
+    if leave_from_seconds is not None:
+        # Skip if leave_from is at/near shift end (full day)
+        if leave_from_seconds < (expected_end - SHIFT_END_TOLERANCE_SECONDS):
+            if last_punch_time is not None:
+                last_punch_seconds = last_punch_time.total_seconds()
+                diff = last_punch_seconds - leave_from_seconds
+                if diff > LEAVE_TOLERANCE_SECONDS:
+                    # Still present after leave_from -> leave taken, present beyond -> "1"
+                    result_leave_from = "1"
+                elif abs(diff) <= LEAVE_TOLERANCE_SECONDS:
+                    result_leave_from = "1"
+                else:
+                    result_leave_from = f"0 ({_fmt(leave_from_seconds)})"
+
+    # Build final result: leave_to result first, leave_from result second
+    parts = [r for r in [result_leave_to, result_leave_from] if r is not None]
+
+    # Leave log exists but no result produced (e.g. leave_from near shift end) -> "1"
+    if not parts:
+        return "1"
+
+    # If both are "1" show just "1"
+    if all(p == "1" for p in parts):
+        return "1"
+
+    return " | ".join(parts)
+
+
+def check_early_leave_absent(leave_entry, employment_type):
+    if not employment_type or employment_type not in SHIFT_END_TIMES:
+        return ""
+
+    if leave_entry is None:
+        return "2"  # absent, no leave log
+
+    # Has leave log — check if full day
+    if leave_entry.get("full_day") == 1:
+        return "1"  # full day leave — expected absent
+
+    # Half day leave (leave_from only OR leave_to only)
+    # Employee should have been present for half day but wasn't
+    leave_from_seconds = leave_entry.get("leave_from")
+    leave_to_seconds = leave_entry.get("leave_to")
+
+    if leave_from_seconds is not None and leave_to_seconds is None:
+        # Should have worked morning, left at leave_from — but fully absent
+        return f"0 ({_fmt(leave_from_seconds)})"
+
+    if leave_to_seconds is not None and leave_from_seconds is None:
+        # Should have returned at leave_to — but fully absent
+        return f"0 ({_fmt(leave_to_seconds)})"
+
+    # Both from and to exist — partial leave, employee fully absent
+    return "1"
+
+
+def _get_attendance_dataset(from_date, to_date):
+    # Active employees always appear (a NULL event row when they have nothing in the range);
+    # inactive employees only when they punched in the range, but then with their leave
+    # rows too so the early leave code of those days still sees the leave log
+    return frappe.db.sql("""
+        SELECT
+            e.name AS employee,
+            e.employee_name,
+            e.attendance_device_id,
+            e.employment_type,
+            e.status,
+            ev.kind,
+            ev.event_date,
+            ev.first_punch,
+            ev.last_punch,
+            ev.leave_from,
+            ev.leave_to,
+            ev.full_day
+        FROM `tabEmployee` e
+        LEFT JOIN (
+            SELECT 'punch' AS kind, employee_no, event_date, first_punch, last_punch,
+                NULL AS leave_from, NULL AS leave_to, 0 AS full_day
+            FROM `tabBiometric Attendance Log`
+            WHERE event_date BETWEEN %(from_date)s AND %(to_date)s AND punch_count > 0
+            UNION ALL
+            SELECT 'leave' AS kind, employee_no, date AS event_date, NULL AS first_punch, NULL AS last_punch,
+                leave_from, leave_to, full_day
+            FROM `tabBiometric Leave Log`
+            WHERE date BETWEEN %(from_date)s AND %(to_date)s
+        ) ev ON ev.employee_no = e.attendance_device_id
+        WHERE e.attendance_device_id IS NOT NULL
+            AND e.attendance_device_id != ''
+            AND (
+                e.status = 'Active'
+                OR e.attendance_device_id IN (
+                    SELECT employee_no
+                    FROM `tabBiometric Attendance Log`
+                    WHERE event_date BETWEEN %(from_date)s AND %(to_date)s AND punch_count > 0
+                )
+            )
+    """, {"from_date": from_date, "to_date": to_date}, as_dict=True)
+
+
+def classify_attendance(from_date, to_date):
+    """
+    Classify every employee-day in the range.
+
+    Returns a list of dicts with employee, employee_name, attendance_device_id,
+    employment_type, date, status ("Present" / "Absent"), first_punch, last_punch, leave
+    (the merged leave entry or None) and early_leave (the daily report's leave code).
+    Active employees get a row for every day; inactive ones only for days they punched.
+    """
+    from_date, to_date = getdate(from_date), getdate(to_date)
+    dates = [from_date + timedelta(days=i) for i in range(date_diff(to_date, from_date) + 1)]
+
+    employees = {}
+    for row in _get_attendance_dataset(from_date, to_date):
+        employee = employees.get(row.employee)
+        if employee is None:
+            employee = employees[row.employee] = frappe._dict(row, punches={}, leaves={})
+
+        event_date = getdate(row.event_date) if row.event_date else None
+        if row.kind == "punch":
+            employee.punches[event_date] = row
+        elif row.kind == "leave":
+            # One employee may have multiple records (e.g. late arrival + early leave)
+            leave = employee.leaves.setdefault(event_date, {"leave_from": None, "leave_to": None, "full_day": 0})
+            if row.full_day:
+                leave["full_day"] = 1
+            if row.leave_from:
+                leave["leave_from"] = parse_time_to_seconds(row.leave_from)
+            if row.leave_to:
+                leave["leave_to"] = parse_time_to_seconds(row.leave_to)
+
+    result = []
+    for employee in employees.values():
+        for date in dates:
+            punch = employee.punches.get(date)
+            leave = employee.leaves.get(date)
+
+            if punch:
+                status = "Present"
+                early_leave = check_early_leave_present(
+                    punch.first_punch, punch.last_punch, leave, employee.employment_type
+                )
+            elif employee.status == "Active":
+                status = "Absent"
+                early_leave = check_early_leave_absent(leave, employee.employment_type)
+            else:
+                continue
+
+            result.append(frappe._dict(
+                employee=employee.employee,
+                employee_name=employee.employee_name,
+                attendance_device_id=employee.attendance_device_id,
+                employment_type=employee.employment_type,
+                date=date,
+                status=status,
+                first_punch=punch.first_punch if punch else None,
+                last_punch=punch.last_punch if punch else None,
+                leave=leave,
+                early_leave=early_leave,
+            ))
+
+    return result
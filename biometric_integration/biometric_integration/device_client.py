@@ -0,0 +1,222 @@
+# Copyright (c) 2026, NDV and contributors
+# For license information, please see license.txt
+
+import secrets
+import threading
+import xml.etree.ElementTree as ET
+
+import frappe
+import requests
+from requests.auth import HTTPDigestAuth
+
+ISAPI_NS = {"ns": "http://www.isapi.org/ver20/XMLSchema"}
+USER_DIRECTORY_TTL = 6 * 60 * 60
+USER_PAGE_SIZE = 30
+
+# One keep-alive client per (site, device, credentials) for the life of the worker process
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class DeviceError(Exception):
+    """The device answered an ISAPI call with a non-200 status."""
+
+    def __init__(self, status_code, text):
+        super().__init__(f"HTTP {status_code}: {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+class DeviceClient:
+    """
+    ISAPI client for one Hikvision terminal.
+
+    Holds a keep-alive session and a single HTTPDigestAuth instance, which remembers the
+    last nonce and answers the next request's challenge up front. Only the first call to
+    a device pays the 401 round trip (or a new one when the device marks the nonce stale).
+    """
+
+    def __init__(self, ip, username, password):
+        self.ip = ip
+        self.base_url = f"http://{ip}"
+        self.session = requests.Session()
+        self.session.auth = HTTPDigestAuth(username, password)
+        self.session.verify = False
+
+    def request(self, method, path, timeout=30, **kwargs):
+        response = self.session.request(method, f"{self.base_url}{path}", timeout=timeout, **kwargs)
+        if response.status_code != 200:
+            raise DeviceError(response.status_code, response.text)
+        return response
+
+    def get_device_info(self, timeout=10):
+        root = ET.fromstring(self.request("GET", "/ISAPI/System/deviceInfo", timeout=timeout).content)
+
+        def text(tag):
+            node = root.find(f"ns:{tag}", ISAPI_NS)
+            return node.text if node is not None else ""
+
+        return frappe._dict(
+            device_name=text("deviceName"),
+            device_id=text("deviceID"),
+            model=text("model"),
+            serial_number=text("serialNumber"),
+            mac_address=text("macAddress"),
+        )
+
+    def search_acs_events(self, cond, timeout=30):
+        """POST AcsEvent/search and return the `AcsEvent` block of the response."""
+        response = self.request(
+            "POST", "/ISAPI/AccessControl/AcsEvent?format=json", json={"AcsEventCond": cond}, timeout=timeout
+        )
+        return response.json().get("AcsEvent", {})
+
+    def search_users(self, cond, timeout=30):
+        """POST UserInfo/Search and return the `UserInfoSearch` block of the response."""
+        response = self.request(
+            "POST", "/ISAPI/AccessControl/UserInfo/Search?format=json", json={"UserInfoSearchCond": cond}, timeout=timeout
+        )
+        return response.json().get("UserInfoSearch", {})
+
+    def iter_users(self, page_size=USER_PAGE_SIZE, timeout=30):
+        """Page through every UserInfo record on the device."""
+        cond = {
+            "searchID": frappe.generate_hash(length=8),
+            "searchResultPosition": 0,
+            "maxResults": page_size,
+        }
+
+        while True:
+            result = self.search_users(cond, timeout=timeout)
+            users = result.get("UserInfo") or []
+            yield from users
+
+            status = result.get("responseStatusStrg")
+            if not users or (status and status != "MORE") or (not status and len(users) < page_size):
+                return
+
+            cond["searchResultPosition"] += len(users)
+
+    def modify_user(self, user_info, timeout=30):
+        return self.request(
+            "PUT", "/ISAPI/AccessControl/UserInfo/Modify?format=json", json={"UserInfo": user_info}, timeout=timeout
+        )
+
+
+def _user_directory_key(client):
+    return f"biometric_device_users|{client.ip}"
+
+
+def get_user_directory(client, refresh=False):
+    """
+    Return the device's employee_no -> name map.
+
+    The full UserInfo list is downloaded in one paged pass and kept in Redis for
+    USER_DIRECTORY_TTL seconds, so syncs resolve names without per-employee lookups.
+    """
+    directory = None if refresh else get_cached_user_directory(client)
+
+    if directory is None:
+        directory = fetch_user_directory(client)
+        cache_user_directory(client, directory)
+
+    return directory
+
+
+def get_cached_user_directory(client):
+    return frappe.cache.get_value(_user_directory_key(client))
+
+
+def fetch_user_directory(client):
+    """Download the employee_no -> name map from the device. HTTP only, safe in a worker thread."""
+    return {
+        str(user.get("employeeNo")): user.get("name") or ""
+        for user in client.iter_users()
+        if user.get("employeeNo")
+    }
+
+
+def cache_user_directory(client, directory):
+    frappe.cache.set_value(_user_directory_key(client), directory, expires_in_sec=USER_DIRECTORY_TTL)
+
+
+def clear_user_directory(client):
+    frappe.cache.delete_value(_user_directory_key(client))
+    frappe.cache.delete_value(_unknown_users_key(client))
+
+
+def _unknown_users_key(client):
+    return f"biometric_device_unknown_users|{client.ip}"
+
+
+def refresh_user_directory_for(client, directory, employee_nos):
+    """
+    Return the directory, re-downloaded when `employee_nos` has someone it does not know.
+
+    Employee numbers still missing after a refresh (usually departed staff whose punches
+    remain on the device) are remembered per device for USER_DIRECTORY_TTL seconds, so
+    they do not force a full UserInfo download on every sync.
+    """
+    unknown_key = _unknown_users_key(client)
+    known_unknown = frappe.cache.get_value(unknown_key) or set()
+
+    unknown = {str(employee_no) for employee_no in employee_nos if employee_no} - set(directory) - known_unknown
+    if not unknown:
+        return directory
+
+    directory = get_user_directory(client, refresh=True)
+    frappe.cache.set_value(
+        unknown_key, known_unknown | (unknown - set(directory)), expires_in_sec=USER_DIRECTORY_TTL
+    )
+    return directory
+
+
+def get_client(ip, username, password):
+    site = getattr(frappe.local, "site", None)
+    key = (site, ip, username, password)
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            # Drop sessions opened with credentials that have since changed
+            for stale in [k for k in _clients if k[:3] == key[:3]]:
+                _clients.pop(stale).session.close()
+            client = _clients[key] = DeviceClient(ip, username, password)
+
+    return client
+
+
+def get_device_client(doc, password=None):
+    """Return the shared client for a document holding ip / username / password fields."""
+    return get_client(doc.ip, doc.username, password or doc.get_password("password"))
+
+
+def update_device_info(doc):
+    """Fill the read-only device info fields of a device document from /System/deviceInfo."""
+    try:
+        if not doc.ip or not doc.username:
+            return
+
+        password = doc.get_password("password", raise_exception=False)
+        if not password:
+            return
+
+        try:
+            info = get_device_client(doc, password).get_device_info()
+        except DeviceError:
+            return
+
+        doc.device_name = info.device_name
+        doc.device_id = info.device_id
+        doc.model = info.model
+        doc.device_serial_number = info.serial_number
+        doc.mac_address = info.mac_address
+
+    except Exception as e:
+        frappe.log_error(f"Device info fetch failed: {e!s}", "Biometric Device Info")
+
+
+def set_push_token(doc):
+    """Give a device document the token it authenticates pushed events with, on first save."""
+    if not doc.push_token:
+        doc.push_token = secrets.token_hex(16)
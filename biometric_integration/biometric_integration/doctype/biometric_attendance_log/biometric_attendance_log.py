@@ -2,8 +2,18 @@
 # For license information, please see license.txt
 
 import frappe
-from frappe.utils import add_days, today
+from frappe.utils import add_days, add_months, get_first_day, getdate, now, today
 from frappe.model.document import Document
+from biometric_integration.biometric_integration.attendance_archive import get_closed_months, write_month_archive
+from biometric_integration.biometric_integration.attendance_cache import clear_month_cache
+from biometric_integration.biometric_integration.attendance_compute import (
+    PunchDays,
+    format_minutes_to_hhmm,
+    punch_idx_shifts,
+    punch_insert_idx,
+    seconds_to_time,
+    time_to_seconds,
+)
 
 
 class BiometricAttendanceLog(Document):
@@ -13,44 +23,256 @@ class BiometricAttendanceLog(Document):
     def after_insert(self):
         update_total_hours(self)
 
+    def on_trash(self):
+        clear_month_cache([getdate(self.event_date)])
 
-# ── helpers (exact logic from report) ─────────────────────────────────────────
 
-def calculate_total_minutes(punches):
-    total_minutes = 0
-    for i in range(0, len(punches) - 1, 2):
-        try:
-            punch_in  = punches[i]["punch_time"]
-            punch_out = punches[i + 1]["punch_time"]
-            minutes_diff = int(punch_out.total_seconds() / 60) - int(punch_in.total_seconds() / 60)
-            total_minutes += minutes_diff
-        except Exception:
-            return 0
-    return total_minutes
+def on_doctype_update():
+    # One log per employee and day: backs every (employee_no, event_date) lookup and
+    # stops concurrent syncs from creating the same day twice
+    frappe.db.add_unique(
+        "Biometric Attendance Log", ["employee_no", "event_date"], constraint_name="unique_employee_no_event_date"
+    )
+    # Reports scan whole date ranges across employees
+    frappe.db.add_index("Biometric Attendance Log", ["event_date"])
+
+
+# ── day summary ───────────────────────────────────────────────────────────────
+
+def get_total_hours_label(summary):
+    if summary.odd_punches:
+        return "Odd Punches"
+    return format_minutes_to_hhmm(summary.worked_minutes)
 
-def format_minutes_to_hhmm(minutes):
-    hours, mins = divmod(minutes, 60)
-    return f"{hours:02}:{mins:02}"
+def get_punch_summary(summary, manual_punch_count=0):
+    """
+    The stored day summary fields for a log.
+
+    worked_minutes pairs punches in order and ignores a trailing odd punch, like the
+    monthly report; odd_punches flags the days the daily report marks for checking.
+    """
+    return {
+        "total_hours": get_total_hours_label(summary),
+        "worked_minutes": summary.worked_minutes,
+        "punch_count": summary.punch_count,
+        "manual_punch_count": manual_punch_count,
+        "first_punch": seconds_to_time(summary.first_punch) if summary.punch_count else None,
+        "last_punch": seconds_to_time(summary.last_punch) if summary.punch_count else None,
+        "odd_punches": summary.odd_punches,
+    }
 
 def update_total_hours(doc):
+    """Recompute the stored total hours and day summary of one log."""
+    refresh_total_hours([doc.name])
+
+def refresh_total_hours(log_names):
+    """Recompute total_hours and the day summary for many logs with a single punch query."""
+    if not log_names:
+        return
+
     punches = frappe.db.sql("""
-        SELECT punch_time, punch_type
+        SELECT parent, punch_time, punch_type
         FROM `tabBiometric Attendance Punch Table`
-        WHERE parent = %(name)s
-        ORDER BY punch_time
-    """, {"name": doc.name}, as_dict=True)
-
-    if not punches:
-        return  
-		
-    if len(punches) % 2 != 0:
-        result = "Odd Punches"
-    else:
-        result = format_minutes_to_hhmm(calculate_total_minutes(punches))
+        WHERE parent IN %(names)s
+        ORDER BY parent, punch_time
+    """, {"names": tuple(log_names)}, as_dict=True)
+
+    days = PunchDays.from_rows(punches, key=lambda punch: punch.parent)
+    for log_name in set(log_names) - set(days.keys):
+        days.add_day(log_name, [])
+
+    manual_counts = {}
+    for punch in punches:
+        if punch.punch_type == "Manual":
+            manual_counts[punch.parent] = manual_counts.get(punch.parent, 0) + 1
+
+    for log_name, summary in days.summaries().items():
+        frappe.db.set_value(
+            "Biometric Attendance Log", log_name,
+            get_punch_summary(summary, manual_counts.get(log_name, 0)),
+            update_modified=False,
+        )
+
+    # Every punch change funnels through here, so this is where cached month grids go stale
+    clear_month_cache(frappe.db.sql_list("""
+        SELECT DISTINCT event_date
+        FROM `tabBiometric Attendance Log`
+        WHERE name IN %(names)s
+    """, {"names": tuple(log_names)}))
+
+
+# ── bulk punch store ──────────────────────────────────────────────────────────
+
+def _load_logs(keys):
+    """Map (employee_no, event_date) keys to their existing log rows with one query."""
+    log_by_key = {}
+    for log in frappe.db.sql("""
+        SELECT name, employee_no, event_date, employee_name
+        FROM `tabBiometric Attendance Log`
+        WHERE employee_no IN %(employee_nos)s AND event_date IN %(event_dates)s
+    """, {
+        "employee_nos": tuple({key[0] for key in keys}),
+        "event_dates": tuple({key[1] for key in keys}),
+    }, as_dict=True):
+        key = (log.employee_no, getdate(log.event_date))
+        if key in keys:
+            log_by_key[key] = log
+
+    return log_by_key
+
+def bulk_add_punches(punches, punch_type="Auto"):
+    """
+    Add many punches in one pass.
+
+    `punches` is an iterable of dicts with employee_no, event_date, punch_time and an
+    optional employee_name. The logs and punches of every touched (employee_no, event_date)
+    are loaded with one query each, only missing punches are bulk inserted and total hours
+    are recomputed once per touched log. New rows take their sorted idx; existing rows after
+    them only have their idx shifted, nothing is deleted and re-inserted.
+
+    Returns {"added": int, "skipped": int, "logs": [log names that got new punches],
+    "inserted": [(employee_no, event_date, seconds) of every punch added]}.
+    """
+    by_key = {}
+    for punch in punches:
+        key = (str(punch["employee_no"]), getdate(punch["event_date"]))
+        entry = by_key.setdefault(key, {"employee_name": "", "seconds": []})
+        entry["seconds"].append(time_to_seconds(punch["punch_time"]))
+        if punch.get("employee_name"):
+            entry["employee_name"] = punch["employee_name"]
+
+    result = {"added": 0, "skipped": 0, "logs": [], "inserted": []}
+    if not by_key:
+        return result
+
+    log_by_key = _load_logs(by_key)
+
+    timestamp = now()
+    user = frappe.session.user
+
+    missing = [key for key in by_key if key not in log_by_key]
+    if missing:
+        # INSERT IGNORE plus a re-read: if a concurrent sync created the same day first,
+        # the unique key keeps its row and the punches below go to that log instead
+        frappe.db.bulk_insert(
+            "Biometric Attendance Log",
+            fields=["name", "owner", "creation", "modified", "modified_by", "docstatus",
+                    "employee_no", "employee_name", "event_date"],
+            values=[
+                (frappe.generate_hash(length=10), user, timestamp, timestamp, user, 0,
+                 key[0], by_key[key]["employee_name"], key[1])
+                for key in missing
+            ],
+            ignore_duplicates=True,
+        )
+        log_by_key.update(_load_logs(missing))
+
+    existing_seconds = {}
+    existing_idx = {}
+    for row in frappe.db.sql("""
+        SELECT parent, punch_time, idx
+        FROM `tabBiometric Attendance Punch Table`
+        WHERE parent IN %(parents)s
+        ORDER BY parent, punch_time
+    """, {"parents": tuple(log.name for log in log_by_key.values())}, as_dict=True):
+        existing_seconds.setdefault(row.parent, []).append(time_to_seconds(row.punch_time))
+        existing_idx.setdefault(row.parent, []).append(row.idx)
+
+    new_punches = []
+    # name of every new punch row -> (employee_no, event_date, seconds)
+    new_punch_keys = {}
+
+    for key, entry in by_key.items():
+        log = log_by_key[key]
+        log_name = log.name
+        if entry["employee_name"] and not log.employee_name:
+            frappe.db.set_value(
+                "Biometric Attendance Log", log_name, "employee_name", entry["employee_name"], update_modified=False
+            )
 
-    frappe.db.set_value("Biometric Attendance Log", doc.name, "total_hours", result, update_modified=False)
+        existing = existing_seconds.get(log_name, [])
+        seen = set(existing)
+        added = []
 
+        for seconds in sorted(entry["seconds"]):
+            if seconds in seen:
+                result["skipped"] += 1
+                continue
 
+            seen.add(seconds)
+            added.append(seconds)
+
+        # Based on the stored idx, which has gaps once a punch row is deleted
+        new_idx = punch_insert_idx(existing, added, existing_idx.get(log_name))
+        for seconds, idx in zip(added, new_idx, strict=True):
+            punch_name = frappe.generate_hash(length=10)
+            new_punch_keys[punch_name] = (key[0], key[1], seconds, log_name)
+            new_punches.append((
+                punch_name, user, timestamp, timestamp, user, 0,
+                log_name, "Biometric Attendance Log", "punch_table", idx,
+                seconds_to_time(seconds), punch_type,
+            ))
+
+        if added:
+            _shift_punch_idx(log_name, existing, added)
+
+    if new_punches:
+        # (parent, punch_time) is unique, a punch a concurrent writer added meanwhile is dropped
+        frappe.db.bulk_insert(
+            "Biometric Attendance Punch Table",
+            fields=["name", "owner", "creation", "modified", "modified_by", "docstatus",
+                    "parent", "parenttype", "parentfield", "idx", "punch_time", "punch_type"],
+            values=new_punches,
+            ignore_duplicates=True,
+        )
+
+        # Only rows that were really written count as added, so callers never record a
+        # punch the log does not have
+        stored = set(frappe.db.sql_list("""
+            SELECT name
+            FROM `tabBiometric Attendance Punch Table`
+            WHERE name IN %(names)s
+        """, {"names": tuple(new_punch_keys)}))
+
+        logs = {}
+        for punch_name, (employee_no, event_date, seconds, log_name) in new_punch_keys.items():
+            if punch_name not in stored:
+                result["skipped"] += 1
+                continue
+            result["inserted"].append((employee_no, event_date, seconds))
+            logs[log_name] = True
+        result["logs"] = list(logs)
+
+    result["added"] = len(result["inserted"])
+    refresh_total_hours(result["logs"])
+    return result
+
+def _shift_punch_idx(log_name, existing, added):
+    """Make room in idx for punches inserted before existing ones; appends touch no rows."""
+    for seconds in punch_idx_shifts(existing, added):
+        frappe.db.sql("""
+            UPDATE `tabBiometric Attendance Punch Table`
+            SET idx = idx + 1
+            WHERE parent = %s AND punch_time > %s
+        """, (log_name, seconds_to_time(seconds)))
+
+def add_punch(employee_no, event_date, punch_time, punch_type="Auto", employee_name=None):
+    """
+    Add one punch to the day's log in its sorted position, creating the log if needed.
+
+    Returns True if the punch was added, False if the log already had it.
+    """
+    result = bulk_add_punches([{
+        "employee_no": employee_no,
+        "event_date": event_date,
+        "punch_time": punch_time,
+        "employee_name": employee_name,
+    }], punch_type=punch_type)
+    return bool(result["added"])
+
+
+
+PURGE_CHUNK_SIZE = 1000
 
 def delete_old_attendance_logs():
     """Delete Biometric Attendance Logs based on Settings"""
@@ -67,28 +289,88 @@ def delete_old_attendance_logs():
 
     cutoff_date = add_days(today(), -retention_days)
 
-    old_logs = frappe.get_all(
-        "Biometric Attendance Log",
-        filters={
-            "event_date": ["<", cutoff_date]
-        },
-        pluck="name"
-    )
+    if settings.archive_logs_before_deletion:
+        # Only whole months are archived; the rest of the cutoff's month stays until it closes
+        cutoff_date = get_first_day(cutoff_date)
+        chunks = archive_closed_months(cutoff_date)
+    else:
+        chunks = purge_attendance_logs(cutoff_date)
 
-    if not old_logs:
+    if not chunks:
         frappe.logger().info("No old Biometric Attendance Logs found to delete.")
         return
 
-    for log_name in old_logs:
-        frappe.delete_doc(
-            "Biometric Attendance Log",
-            log_name,
-            ignore_permissions=True,
-            force=True
+    frappe.logger().info(
+        f"Deleted {sum(chunk['logs'] for chunk in chunks)} Biometric Attendance Logs and "
+        f"{sum(chunk['punches'] for chunk in chunks)} punches older than "
+        f"{retention_days} days (before {cutoff_date}) in {len(chunks)} chunks"
+    )
+
+def archive_closed_months(before_date):
+    """
+    Move every month that ends before `before_date` out of the hot tables: the month is
+    written to its compressed archive File, committed, and only then purged.
+    Returns the purge chunk reports of all months.
+    """
+    chunks = []
+    for year, month in get_closed_months(before_date):
+        month_start = getdate(f"{year}-{month:02d}-01")
+        archive_file, archived = write_month_archive(year, month)
+        frappe.db.commit()
+        frappe.logger().info(f"Archived {archived} Biometric Attendance Logs of {year}-{month:02d} to {archive_file}")
+
+        chunks.extend(purge_attendance_logs(add_months(month_start, 1), from_date=month_start))
+
+    return chunks
+
+def purge_attendance_logs(cutoff_date, from_date=None, chunk_size=PURGE_CHUNK_SIZE):
+    """
+    Delete every log before `cutoff_date` (and on or after `from_date`) and its punch rows,
+    one bounded chunk per commit.
+
+    Each chunk is two set-based DELETEs (punches, then logs) instead of a delete_doc per log,
+    so no documents are loaded, no hooks run and no Deleted Document records are written.
+    Returns one {"logs", "punches"} report per chunk.
+    """
+    chunks = []
+    conditions = "AND event_date >= %(from_date)s" if from_date else ""
+
+    while True:
+        logs = frappe.db.sql(f"""
+            SELECT name, event_date
+            FROM `tabBiometric Attendance Log`
+            WHERE event_date < %(cutoff_date)s {conditions}
+            ORDER BY event_date, name
+            LIMIT %(limit)s
+        """, {"cutoff_date": cutoff_date, "from_date": from_date, "limit": chunk_size}, as_dict=True)
+        if not logs:
+            break
+
+        log_names = tuple(log.name for log in logs)
+        punches_removed = frappe.db.sql("""
+            SELECT COUNT(*)
+            FROM `tabBiometric Attendance Punch Table`
+            WHERE parenttype = 'Biometric Attendance Log' AND parent IN %(names)s
+        """, {"names": log_names})[0][0]
+
+        frappe.db.sql("""
+            DELETE FROM `tabBiometric Attendance Punch Table`
+            WHERE parenttype = 'Biometric Attendance Log' AND parent IN %(names)s
+        """, {"names": log_names})
+
+        frappe.db.sql("""
+            DELETE FROM `tabBiometric Attendance Log`
+            WHERE name IN %(names)s
+        """, {"names": log_names})
+
+        frappe.db.commit()
+        clear_month_cache([getdate(log.event_date) for log in logs])
+
+        chunk = {"logs": len(logs), "punches": punches_removed}
+        chunks.append(chunk)
+        frappe.logger().info(
+            f"Purged chunk {len(chunks)}: {chunk['logs']} Biometric Attendance Logs and "
+            f"{chunk['punches']} punches up to {logs[-1].event_date}"
         )
 
-    frappe.db.commit()
-    frappe.logger().info(
-        f"Deleted {len(old_logs)} Biometric Attendance Logs older than "
-        f"{retention_days} days (before {cutoff_date})"
-    )
\ No newline at end of file
+    return chunks
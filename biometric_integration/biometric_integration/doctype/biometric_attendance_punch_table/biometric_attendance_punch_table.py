@@ -1,9 +1,16 @@
 # Copyright (c) 2025, NDV and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
 
 class BiometricAttendancePunchTable(Document):
 	pass
+
+
+def on_doctype_update():
+	# A punch time appears once per log; also serves the (parent, punch_time) ordered reads
+	frappe.db.add_unique(
+		"Biometric Attendance Punch Table", ["parent", "punch_time"], constraint_name="unique_parent_punch_time"
+	)
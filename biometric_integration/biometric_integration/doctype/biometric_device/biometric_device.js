@@ -0,0 +1,28 @@
+// Copyright (c) 2026, NDV and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on('Biometric Device', {
+    refresh(frm) {
+        if (frm.is_new()) {
+            return;
+        }
+
+        frm.add_custom_button(__('Test Device Connection'), function() {
+            frappe.call({
+                method: 'biometric_integration.biometric_integration.doctype.biometric_integration_settings.biometric_integration_settings.check_machine_connection',
+                args: { device: frm.doc.name },
+                freeze: true,
+                freeze_message: __('Checking machine connection...'),
+                callback: function(r) {
+                    const result = r.message || {};
+                    frappe.msgprint({
+                        title: result.status === 'success' ? __('Connection Successful') : __('Connection Failed'),
+                        indicator: result.status === 'success' ? 'green' : 'red',
+                        message: `<div><b>${__('Result')}:</b> ${frappe.utils.escape_html(result.message || __('Unknown response'))}</div>
+                                <br><div><b>${__('Details')}:</b><br>${frappe.utils.escape_html(result.details || __('No details available'))}</div>`
+                    });
+                }
+            });
+        });
+    }
+});
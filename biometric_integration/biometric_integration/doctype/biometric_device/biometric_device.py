@@ -0,0 +1,12 @@
+# Copyright (c) 2026, NDV and contributors
+# For license information, please see license.txt
+
+from frappe.model.document import Document
+
+from biometric_integration.biometric_integration.device_client import set_push_token, update_device_info
+
+
+class BiometricDevice(Document):
+    def before_save(self):
+        set_push_token(self)
+        update_device_info(self)
@@ -49,6 +49,22 @@ frappe.ui.form.on('Biometric Integration Settings', {
                         fieldtype: 'Time',
                         default: '23:59:59',
                         reqd: 1
+                    },
+                    { fieldtype: 'Section Break' },
+                    {
+                        label: __('Only New Events'),
+                        fieldname: 'incremental',
+                        fieldtype: 'Check',
+                        default: 1,
+                        description: __('Skip events before the last synced event. Uncheck to re-fetch the whole range.')
+                    },
+                    { fieldtype: 'Column Break' },
+                    {
+                        label: __('Run in Background'),
+                        fieldname: 'background',
+                        fieldtype: 'Check',
+                        default: 1,
+                        description: __('Sync in a background job with live progress. The page can be closed meanwhile.')
                     }
                 ],
                 primary_action_label: __('Sync'),
@@ -57,15 +73,26 @@ frappe.ui.form.on('Biometric Integration Settings', {
                     frappe.call({
                         method: 'biometric_integration.biometric_integration.doctype.biometric_integration_settings.biometric_integration_settings.sync_attendance',
                         args: values,
-                        freeze: true,
+                        freeze: !values.background,
                         freeze_message: __('Syncing Attendance...'),
                         callback: function(r) {
-                            if (r.message) {
-                                frappe.show_alert({
-                                    message: r.message,
-                                    indicator: 'green'
-                                }, 10);
+                            if (!r.message) {
+                                return;
+                            }
+
+                            if (values.background) {
+                                if (r.message.status === 'queued') {
+                                    _watch_attendance_sync();
+                                } else {
+                                    frappe.show_alert({ message: r.message.message, indicator: 'red' }, 10);
+                                }
+                                return;
                             }
+
+                            frappe.show_alert({
+                                message: r.message,
+                                indicator: 'green'
+                            }, 10);
                         }
                     });
                 }
@@ -80,9 +107,10 @@ frappe.ui.form.on('Biometric Integration Settings', {
                     frappe.call({
                         method: 'biometric_integration.biometric_integration.doctype.biometric_integration_settings.biometric_integration_settings.update_all_manual_punches',
                         callback: function(response) {
+                            const result = response.message || {};
                             frappe.show_alert({
-                                message: __(response.message),
-                                indicator: 'green'
+                                message: __(result.message),
+                                indicator: result.status === 'queued' ? 'green' : 'red'
                             });
                         }
                     });
@@ -96,6 +124,25 @@ frappe.ui.form.on('Biometric Integration Settings', {
             );
         }, __('Sync'));
 
+        frm.add_custom_button(__('Rescan Manual Punches'), function() {
+            frappe.confirm(
+                __('Read every manual punch again, not only those changed since the last update?'),
+                function() {
+                    frappe.call({
+                        method: 'biometric_integration.biometric_integration.doctype.biometric_integration_settings.biometric_integration_settings.update_all_manual_punches',
+                        args: { full: 1 },
+                        callback: function(response) {
+                            const result = response.message || {};
+                            frappe.show_alert({
+                                message: __(result.message),
+                                indicator: result.status === 'queued' ? 'green' : 'red'
+                            });
+                        }
+                    });
+                }
+            );
+        }, __('Sync'));
+
         frm.add_custom_button('Fetch Device Info', () => {
             frappe.call({
                 method: 'biometric_integration.biometric_integration.doctype.biometric_integration_settings.biometric_integration_settings.fetch_device_info',
@@ -230,4 +277,56 @@ frappe.ui.form.on('Biometric Integration Settings', {
             });
         });
     }
-});
\ No newline at end of file
+});
+
+function _watch_attendance_sync() {
+    const d = new frappe.ui.Dialog({
+        title: __('Attendance Sync'),
+        fields: [{ fieldname: 'status_html', fieldtype: 'HTML' }],
+        primary_action_label: __('Cancel Sync'),
+        primary_action() {
+            frappe.call({
+                method: 'biometric_integration.biometric_integration.doctype.biometric_integration_settings.biometric_integration_settings.cancel_attendance_sync',
+                callback: function(r) {
+                    if (r.message) {
+                        frappe.show_alert({ message: r.message.message, indicator: 'orange' }, 5);
+                    }
+                }
+            });
+        }
+    });
+
+    const render = function(data) {
+        const percent = data.total ? Math.min(Math.round(data.position * 100 / data.total), 100) : 0;
+        d.fields_dict.status_html.$wrapper.html(`
+            <div class="progress" style="height: 8px; margin-bottom: 12px;">
+                <div class="progress-bar" style="width: ${percent}%"></div>
+            </div>
+            <div>${__('Processed {0} of {1} events', [data.position || 0, data.total || '?'])}</div>
+            <div class="text-muted">
+                ${__('Synced')}: ${data.synced || 0} &nbsp;|&nbsp;
+                ${__('Skipped')}: ${data.skipped || 0} &nbsp;|&nbsp;
+                ${__('Failed')}: ${data.failed || 0}
+            </div>
+        `);
+    };
+
+    const handler = function(data) {
+        if (data.status === 'started' || data.status === 'progress') {
+            render(data);
+            return;
+        }
+
+        frappe.realtime.off('biometric_attendance_sync', handler);
+        d.hide();
+        frappe.msgprint({
+            title: __('Attendance Sync'),
+            indicator: data.status === 'completed' ? 'green' : (data.status === 'cancelled' ? 'orange' : 'red'),
+            message: frappe.utils.escape_html(data.message || data.status)
+        });
+    };
+
+    render({});
+    frappe.realtime.on('biometric_attendance_sync', handler);
+    d.show();
+}
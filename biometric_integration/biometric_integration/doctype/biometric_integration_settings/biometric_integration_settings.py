@@ -2,51 +2,56 @@
 # For license information, please see license.txt
 
 import frappe
+import queue
+import secrets
+import threading
+import time
 import requests
-from requests.auth import HTTPDigestAuth
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from frappe.model.document import Document
+from frappe.utils import cint, get_datetime, now_datetime
+from frappe.utils.background_jobs import is_job_enqueued
+from biometric_integration.biometric_integration.device_client import (
+    DeviceError,
+    cache_user_directory,
+    clear_user_directory,
+    fetch_user_directory,
+    get_cached_user_directory,
+    get_device_client,
+    refresh_user_directory_for,
+    set_push_token,
+    update_device_info,
+)
+from biometric_integration.biometric_integration.doctype.biometric_attendance_log.biometric_attendance_log import (
+    bulk_add_punches,
+)
+
+ACS_EVENT_PAGE_SIZE = 30
+ACS_EVENT_MIN_PAGE_SIZE = 10
+ACS_EVENT_MAX_PAGE_SIZE = 200
+ACS_EVENT_FAST_PAGE_SECONDS = 3
+ACS_EVENT_SLOW_PAGE_SECONDS = 20
+ACS_EVENT_TIMEOUT = (10, 120)
+WATERMARK_OVERLAP = timedelta(minutes=10)
+DEVICE_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S+08:00"
+SYNC_JOB_ID = "biometric_attendance_sync"
+SYNC_JOB_TIMEOUT = 6 * 60 * 60
+SYNC_CANCEL_KEY = "biometric_attendance_sync_cancel"
+SYNC_REALTIME_EVENT = "biometric_attendance_sync"
+MAX_SYNC_WORKERS = 8
+MANUAL_PUNCH_JOB_ID = "biometric_manual_punch_reconcile"
+MANUAL_PUNCH_BATCH_SIZE = 1000
+
 
 class BiometricIntegrationSettings(Document):
     def before_save(self):
-        try:
-            if not self.ip or not self.username:
-                return
-
-            password = self.get_password("password")
-            if not password:
-                return
-
-            url = f"http://{self.ip}/ISAPI/System/deviceInfo"
-
-            response = requests.get(
-                url,
-                auth=HTTPDigestAuth(self.username, password),
-                timeout=10,
-                verify=False
-            )
-
-            if response.status_code != 200:
-                return
-
-            import xml.etree.ElementTree as ET
-
-            root = ET.fromstring(response.content)
-            ns = {'ns': 'http://www.isapi.org/ver20/XMLSchema'}
-
-            self.device_name = root.find('ns:deviceName', ns).text if root.find('ns:deviceName', ns) is not None else ""
-            self.device_id = root.find('ns:deviceID', ns).text if root.find('ns:deviceID', ns) is not None else ""
-            self.model = root.find('ns:model', ns).text if root.find('ns:model', ns) is not None else ""
-            self.device_serial_number = root.find('ns:serialNumber', ns).text if root.find('ns:serialNumber', ns) is not None else ""
-            self.mac_address = root.find('ns:macAddress', ns).text if root.find('ns:macAddress', ns) is not None else ""
-
-        except Exception as e:
-            frappe.log_error(f"Device info fetch failed: {str(e)}", "Biometric Device Info")
+        set_push_token(self)
+        update_device_info(self)
 
 @frappe.whitelist()
-def fetch_device_info():
-    doc = frappe.get_doc("Biometric Integration Settings", "Biometric Integration Settings")
-    doc.before_save()
+def fetch_device_info(device=None):
+    doc = _get_device(device)
     doc.save(ignore_permissions=True)
 
     return {
@@ -58,34 +63,18 @@ def fetch_device_info():
 def get_employee_face(emp_no):
     try:
         settings = frappe.get_doc("Biometric Integration Settings", "Biometric Integration Settings")
-        password = settings.get_password("password")
 
-        url = f"http://{settings.ip}/ISAPI/AccessControl/UserInfo/Search?format=json"
-        headers = {"Content-Type": "application/json"}
-
-        payload = {
-            "UserInfoSearchCond": {
+        try:
+            result = get_device_client(settings).search_users({
                 "searchID": "face-fetch",
                 "searchResultPosition": 0,
                 "maxResults": 1,
                 "EmployeeNoList": [{"employeeNo": str(emp_no)}]
-            }
-        }
-
-        response = requests.post(
-            url,
-            auth=HTTPDigestAuth(settings.username, password),
-            headers=headers,
-            json=payload,
-            verify=False,
-            timeout=30,
-        )
+            })
+        except DeviceError as e:
+            return {"status": "error", "message": f"HTTP {e.status_code}"}
 
-        if response.status_code != 200:
-            return {"status": "error", "message": f"HTTP {response.status_code}"}
-
-        data = response.json()
-        user_info = data.get("UserInfoSearch", {}).get("UserInfo", [])
+        user_info = result.get("UserInfo", [])
 
         if not user_info:
             return {"status": "error", "message": "Employee not found"}
@@ -106,10 +95,16 @@ def get_employee_face(emp_no):
         frappe.log_error(f"Face fetch failed: {str(e)}", "Biometric Face Fetch")
         return {"status": "error", "message": str(e)}
     
+def _get_device(device=None):
+    """A Biometric Device by name, or the primary device configured on the settings."""
+    if device:
+        return frappe.get_doc("Biometric Device", device)
+    return frappe.get_doc("Biometric Integration Settings", "Biometric Integration Settings")
+
 @frappe.whitelist()
-def check_machine_connection():
+def check_machine_connection(device=None):
     try:
-        settings = frappe.get_doc("Biometric Integration Settings", "Biometric Integration Settings")
+        settings = _get_device(device)
 
         if not settings.ip or not settings.username:
             return {
@@ -126,12 +121,10 @@ def check_machine_connection():
                 "details": "Machine password is missing.",
             }
 
-        url = f"http://{settings.ip}/ISAPI/AccessControl/AcsEvent?format=json"
-        headers = {"Content-Type": "application/json"}
         now = datetime.now().strftime("%Y-%m-%d")
 
-        payload = {
-            "AcsEventCond": {
+        try:
+            get_device_client(settings, password).search_acs_events({
                 "searchID": "connection-check",
                 "searchResultPosition": 0,
                 "maxResults": 1,
@@ -139,29 +132,18 @@ def check_machine_connection():
                 "minor": 75,
                 "startTime": f"{now}T00:00:00+08:00",
                 "endTime": f"{now}T23:59:59+08:00",
-            }
-        }
-
-        response = requests.post(
-            url,
-            auth=HTTPDigestAuth(settings.username, password),
-            headers=headers,
-            json=payload,
-            verify=False,
-            timeout=30,
-        )
-
-        if response.status_code == 200:
+            })
+        except DeviceError as e:
             return {
-                "status": "success",
-                "message": "Connection successful.",
-                "details": f"Connected to {settings.ip}. Device response status: 200.",
+                "status": "error",
+                "message": "Connection failed.",
+                "details": str(e),
             }
 
         return {
-            "status": "error",
-            "message": "Connection failed.",
-            "details": f"HTTP {response.status_code}: {response.text}",
+            "status": "success",
+            "message": "Connection successful.",
+            "details": f"Connected to {settings.ip}. Device response status: 200.",
         }
 
     except requests.exceptions.RequestException as e:
@@ -179,89 +161,32 @@ def check_machine_connection():
         }
 
 
-def _get_employee_name_from_device(settings, password, emp_no):
-    url = f"http://{settings.ip}/ISAPI/AccessControl/UserInfo/Search?format=json"
-    headers = {"Content-Type": "application/json"}
-
-    payloads = [
-        {
-            "UserInfoSearchCond": {
-                "searchID": "1",
-                "searchResultPosition": 0,
-                "maxResults": 1,
-                "EmployeeNoList": [{"employeeNo": str(emp_no)}],
-            }
-        },
-        {
-            "UserInfoSearchCond": {
-                "searchID": "1",
-                "searchResultPosition": 0,
-                "maxResults": 1,
-                "employeeNoList": [{"employeeNo": str(emp_no)}],
-            }
-        },
-    ]
-
-    for payload in payloads:
-        try:
-            response = requests.post(
-                url,
-                auth=HTTPDigestAuth(settings.username, password),
-                headers=headers,
-                json=payload,
-                verify=False,
-                timeout=30,
-            )
-            if response.status_code != 200:
-                continue
-
-            data = response.json()
-            user_info = data.get("UserInfoSearch", {}).get("UserInfo", [])
-            if user_info and user_info[0].get("name"):
-                return user_info[0].get("name")
-        except Exception:
-            continue
-
-    return ""
-
 @frappe.whitelist()
 def set_employee_name_on_device(emp_no, emp_name=None):
     try:
         settings = frappe.get_doc("Biometric Integration Settings", "Biometric Integration Settings")
-        password = settings.get_password("password")
 
         if not emp_no:
             return {"status": "error", "message": "Employee No is required"}
 
-        url = f"http://{settings.ip}/ISAPI/AccessControl/UserInfo/Modify?format=json"
-        headers = {"Content-Type": "application/json"}
-
         # 👉 If emp_name not passed OR empty → remove name
         name_value = str(emp_name) if emp_name else ""
 
-        payload = {
-            "UserInfo": {
+        client = get_device_client(settings)
+        try:
+            client.modify_user({
                 "employeeNo": str(emp_no),
                 "name": name_value
-            }
-        }
-
-        response = requests.put(
-            url,
-            auth=HTTPDigestAuth(settings.username, password),
-            headers=headers,
-            json=payload,
-            verify=False,
-            timeout=30,
-        )
+            })
+        except DeviceError as e:
+            return {"status": "error", "message": f"Device returned HTTP {e.status_code}: {e.text}"}
 
-        if response.status_code == 200:
-            if name_value:
-                return {"status": "success", "message": f"Name '{name_value}' updated for employee {emp_no}"}
-            else:
-                return {"status": "success", "message": f"Name removed for employee {emp_no}"}
+        clear_user_directory(client)
 
-        return {"status": "error", "message": f"Device returned HTTP {response.status_code}: {response.text}"}
+        if name_value:
+            return {"status": "success", "message": f"Name '{name_value}' updated for employee {emp_no}"}
+        else:
+            return {"status": "success", "message": f"Name removed for employee {emp_no}"}
 
     except requests.exceptions.RequestException as e:
         return {"status": "error", "message": f"Network error: {str(e)}"}
@@ -270,173 +195,515 @@ def set_employee_name_on_device(emp_no, emp_name=None):
         return {"status": "error", "message": str(e)}
 
 
-def _get_employee_name(settings, password, emp_no, name_cache=None):
-    cache = name_cache if isinstance(name_cache, dict) else {}
-    cache_key = str(emp_no)
+def _refresh_user_directory(client, directory, events):
+    try:
+        return refresh_user_directory_for(client, directory, (log.get("employeeNoString") for log in events))
+    except Exception as e:
+        frappe.log_error(f"Device user directory fetch failed: {str(e)}", "Biometric User Directory")
+        return directory
+
+def _ingest_events(events, user_directory):
+    """Write one page of AcsEvent records through the bulk punch store."""
+    punches = []
+    failed = 0
+    for log in events:
+        emp_no = log.get("employeeNoString")
+        event_timestamp = log.get("time", "")
+        if not emp_no or not event_timestamp:
+            continue
+
+        event_datetime = _event_datetime(log)
+        if not event_datetime:
+            failed += 1
+            continue
 
-    if cache_key in cache:
-        return cache[cache_key]
+        punches.append({
+            "employee_no": emp_no,
+            "event_date": event_datetime.date(),
+            "punch_time": event_datetime.time(),
+            "employee_name": user_directory.get(str(emp_no), ""),
+        })
+
+    result = bulk_add_punches(punches, punch_type="Auto")
+    result["failed"] = failed
+    return result
+
+def _acs_event_has_more(data, position, received, page_size):
+    # Newer firmware reports "MORE" / "OK" / "NO MATCH"; older firmware only reports totalMatches,
+    # and a short page is only the last one when nothing tells us otherwise
+    status = data.get("responseStatusStrg")
+    if status:
+        return status == "MORE"
+    total_matches = cint(data.get("totalMatches"))
+    if total_matches:
+        return position + received < total_matches
+    return received >= page_size
+
+def iter_acs_event_pages(client, start_time, end_time, position=0, page_size=ACS_EVENT_PAGE_SIZE):
+    """
+    Stream AcsEvent InfoList pages from the device.
+
+    Yields (events, next_position, total_matches, page_size, page_seconds) one page at a time
+    so callers can ingest and checkpoint each page before the next one is requested. The page
+    size grows while the device returns full pages quickly and backs off on slow pages,
+    timeouts or pages the device cut short. Touches no database state, so it can run in a
+    worker thread.
+    """
+    cond = {
+        "searchID": secrets.token_hex(4),
+        "searchResultPosition": position,
+        "maxResults": page_size,
+        "major": 5,
+        "minor": 75,
+        "startTime": start_time,
+        "endTime": end_time,
+    }
 
-    employee_name = _get_employee_name_from_device(settings, password, emp_no)
+    page_size = min(max(page_size, ACS_EVENT_MIN_PAGE_SIZE), ACS_EVENT_MAX_PAGE_SIZE)
+    device_limit = ACS_EVENT_MAX_PAGE_SIZE
 
-    employee_name = employee_name or ""
-    cache[cache_key] = employee_name
-    return employee_name
+    while True:
+        cond["searchResultPosition"] = position
+        cond["maxResults"] = page_size
 
-@frappe.whitelist()
-def sync_attendance(from_date=None, from_time=None, to_date=None, to_time=None):
+        started = time.monotonic()
+        try:
+            data = client.search_acs_events(cond, timeout=ACS_EVENT_TIMEOUT)
+        except requests.exceptions.Timeout:
+            if page_size <= ACS_EVENT_MIN_PAGE_SIZE:
+                raise
+            # Retry the same position with a smaller page
+            page_size = max(page_size // 2, ACS_EVENT_MIN_PAGE_SIZE)
+            device_limit = page_size
+            continue
+        elapsed = time.monotonic() - started
+
+        events = data.get("InfoList") or []
+
+        if not events:
+            return
+
+        requested = page_size
+        has_more = _acs_event_has_more(data, position, len(events), requested)
+
+        if not (data.get("responseStatusStrg") or cint(data.get("totalMatches"))):
+            # Without a status or total a capped page reads as the last one, so never ask
+            # for more than the device has already filled
+            device_limit = min(device_limit, len(events))
+
+        if has_more and len(events) < requested:
+            # The device caps maxResults below what we asked for, stick to its limit
+            device_limit = max(len(events), ACS_EVENT_MIN_PAGE_SIZE)
+            page_size = device_limit
+        elif elapsed > ACS_EVENT_SLOW_PAGE_SECONDS:
+            page_size = max(page_size // 2, ACS_EVENT_MIN_PAGE_SIZE)
+        elif len(events) >= requested and elapsed < ACS_EVENT_FAST_PAGE_SECONDS:
+            page_size = min(page_size * 2, device_limit)
+
+        position += len(events)
+        yield events, position, data.get("totalMatches", 0), page_size, elapsed
+
+        if not has_more:
+            return
+
+def get_page_size(settings, model):
+    for row in settings.get("device_page_sizes") or []:
+        if model and row.model == model and row.page_size:
+            return row.page_size
+    return ACS_EVENT_PAGE_SIZE
+
+def remember_page_size(settings, model, page_size, page_seconds=0):
+    """Store the page size settled on for a device model on Biometric Integration Settings."""
+    if not model:
+        return
+
+    for row in settings.get("device_page_sizes") or []:
+        if row.model == model:
+            row.db_set({"page_size": page_size, "last_page_seconds": page_seconds}, update_modified=False)
+            return
+
+    row = settings.append("device_page_sizes", {
+        "model": model,
+        "page_size": page_size,
+        "last_page_seconds": page_seconds,
+    })
+    row.db_insert()
+
+def _event_datetime(log):
     try:
-        settings = frappe.get_doc("Biometric Integration Settings", "Biometric Integration Settings")
-        url = f"http://{settings.ip}/ISAPI/AccessControl/AcsEvent?format=json"
-        decrypted_password = settings.get_password("password")
+        return datetime.strptime((log.get("time") or "")[:19], "%Y-%m-%dT%H:%M:%S")
+    except ValueError:
+        return None
+
+def _drop_seen_events(events, overlap_start, watermark_time, watermark_serial):
+    """Drop events inside the overlap window that the watermark says were already synced."""
+    if not overlap_start or not watermark_time or not watermark_serial:
+        return events
+
+    fresh = []
+    for log in events:
+        serial_no = cint(log.get("serialNo"))
+        event_time = _event_datetime(log)
+        if (
+            event_time and serial_no and overlap_start <= event_time <= watermark_time
+            and serial_no <= watermark_serial
+        ):
+            continue
+        fresh.append(log)
+    return fresh
 
-        _from_date = from_date or settings.start_date_and_time.split(" ")[0]
-        _from_time = from_time or "00:00:00"
-        _to_date = to_date or settings.end_date_and_time.split(" ")[0]
-        _to_time = to_time or "23:59:59"
+def _advance_watermark(events, watermark_time, watermark_serial):
+    for log in events:
+        event_time = _event_datetime(log)
+        if not event_time:
+            continue
+        if not watermark_time or event_time > watermark_time:
+            watermark_time = event_time
+        watermark_serial = max(watermark_serial or 0, cint(log.get("serialNo")))
+    return watermark_time, watermark_serial
+
+def _set_device_state(device, values):
+    frappe.db.set_value(device.doctype, device.name, values, update_modified=False)
+
+def _publish_progress(position, total_records, counts):
+    if total_records:
+        frappe.publish_progress(
+            min(position * 100 / total_records, 100),
+            title="Attendance Sync",
+            description=f"Processed {position} of {total_records} events...",
+        )
 
-        start_time = datetime.strptime(f"{_from_date} {_from_time}", "%Y-%m-%d %H:%M:%S").strftime("%Y-%m-%dT%H:%M:%S+08:00")
-        end_time = datetime.strptime(f"{_to_date} {_to_time}", "%Y-%m-%d %H:%M:%S").strftime("%Y-%m-%dT%H:%M:%S+08:00")
+def get_sync_devices():
+    """The primary device on the settings (when configured) plus every enabled Biometric Device."""
+    devices = []
 
-        headers = {"Content-Type": "application/json"}
+    settings = frappe.get_doc("Biometric Integration Settings", "Biometric Integration Settings")
+    if settings.ip and settings.username:
+        devices.append(settings)
 
-        payload = {
-            "AcsEventCond": {
-                "searchID": "123456789",
-                "searchResultPosition": 0,
-                "maxResults": 1,
-                "major": 5,
-                "minor": 75,
-                "startTime": start_time,   # <-- must use start_time not settings field
-                "endTime": end_time,       # <-- must use end_time not settings field
-            }
-        }
+    for name in frappe.get_all("Biometric Device", filters={"enabled": 1}, pluck="name", order_by="creation"):
+        devices.append(frappe.get_doc("Biometric Device", name))
 
-        response = requests.post(
-            url,
-            auth=HTTPDigestAuth(settings.username, decrypted_password),
-            headers=headers,
-            json=payload,
-            verify=False,
-            timeout=600,
-        )
+    return devices
 
-        if response.status_code != 200:
-            frappe.throw(f"Failed to fetch attendance logs. Status: {response.status_code}, Response: {response.text}")
+def _device_label(device):
+    return device.get("device_title") or device.get("device_name") or device.ip
 
-        data = response.json()
-        total_records = data.get("AcsEvent", {}).get("totalMatches", 0)
+def _put_page(pages, item, stop):
+    """Hand an item to the main thread, giving up once it asked the workers to stop."""
+    while not stop.is_set():
+        try:
+            pages.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
 
-        if total_records == 0:
-            return "No attendance records found for the given time period."
+def _fetch_device_pages(key, client, start_time, end_time, position, page_size, pages, stop, fetch_directory):
+    # Runs in a worker thread: HTTP only, everything is handed to the main thread through `pages`
+    try:
+        if fetch_directory:
+            try:
+                directory = fetch_user_directory(client)
+            except Exception as e:
+                directory = e
+            if not _put_page(pages, ("directory", key, directory), stop):
+                return
 
-        if total_records > 1500:
-            return "Too many records to process. Please reduce the date range and try again."
+        for page in iter_acs_event_pages(client, start_time, end_time, position=position, page_size=page_size):
+            if not _put_page(pages, ("page", key, page), stop):
+                break
+    except Exception as e:
+        _put_page(pages, ("error", key, e), stop)
+    finally:
+        # Always delivered: the main thread drains the queue until every worker is done
+        pages.put(("done", key, None))
+
+def _sync_attendance(from_date=None, from_time=None, to_date=None, to_time=None, incremental=0,
+                     on_progress=_publish_progress, should_stop=None):
+    """
+    Pull a window of AcsEvents from every device into Biometric Attendance Log.
+
+    Devices are paged concurrently by a bounded thread pool, while pages are ingested,
+    deduplicated across devices and committed one at a time on this thread together with
+    that device's checkpoint and watermark. Without from_date each device starts from its
+    own watermark (or two days back on its first sync). `on_progress(position, total, counts)`
+    is called after every page and `should_stop()` is checked between pages. Returns the
+    counts with a summary message.
+    """
+    settings = frappe.get_doc("Biometric Integration Settings", "Biometric Integration Settings")
+    devices = get_sync_devices()
+    counts = {"synced": 0, "skipped": 0, "failed": 0, "cancelled": False}
+
+    if not devices:
+        frappe.throw("No biometric device is configured.")
+
+    end_datetime = now_datetime().replace(microsecond=0)
+    if to_date:
+        end_datetime = datetime.strptime(f"{to_date} {to_time or '23:59:59'}", "%Y-%m-%d %H:%M:%S")
+
+    requested_start = None
+    if from_date:
+        requested_start = datetime.strptime(f"{from_date} {from_time or '00:00:00'}", "%Y-%m-%d %H:%M:%S")
+    default_start = datetime.combine(end_datetime.date() - timedelta(days=2), datetime.min.time())
+
+    states = {}
+    for device in devices:
+        watermark_time = get_datetime(device.last_event_time) if device.last_event_time else None
+
+        start_datetime = requested_start or default_start
+        overlap_start = None
+        if (
+            watermark_time and (cint(incremental) or not requested_start)
+            and watermark_time - WATERMARK_OVERLAP <= end_datetime
+            and (not requested_start or requested_start < watermark_time - WATERMARK_OVERLAP)
+        ):
+            # Only ask the device for events after the watermark, keeping an overlap for clock
+            # skew. A window that ends before the watermark is a backfill and is fetched as asked
+            overlap_start = watermark_time - WATERMARK_OVERLAP
+            start_datetime = overlap_start
+
+        if start_datetime > end_datetime:
+            continue
 
-        count = 0
-        skipped = 0
-        employee_name_cache = {}
-        position = 0
-        batch_size = 30
-        frappe.publish_progress(0, title="Attendance Sync", description="Starting attendance sync...")
+        start_time = start_datetime.strftime(DEVICE_TIME_FORMAT)
+        end_time = end_datetime.strftime(DEVICE_TIME_FORMAT)
+
+        # Resume an interrupted sync of the same window from its last committed page
+        window = f"{start_time}|{end_time}"
+        position = cint(device.sync_checkpoint_position) if device.sync_checkpoint_window == window else 0
+        client = get_device_client(device)
+
+        states[(device.doctype, device.name)] = frappe._dict(
+            device=device,
+            client=client,
+            start_time=start_time,
+            end_time=end_time,
+            window=window,
+            position=position,
+            resumed_from=position,
+            total=0,
+            page_size=get_page_size(settings, device.model),
+            page_seconds=0,
+            overlap_start=overlap_start,
+            seen_time=watermark_time,
+            seen_serial=cint(device.last_event_serial_no),
+            watermark_time=watermark_time,
+            watermark_serial=cint(device.last_event_serial_no),
+            # A cold directory is downloaded by this device's worker, not serially here
+            user_directory=get_cached_user_directory(client),
+            directory_refreshed=False,
+            error=None,
+        )
+
+    if not states:
+        counts["message"] = "No new attendance records since the last sync."
+        return counts
 
-        while True:
-            payload["AcsEventCond"]["searchResultPosition"] = position
-            payload["AcsEventCond"]["maxResults"] = batch_size
-
-            response = requests.post(
-                url,
-                auth=HTTPDigestAuth(settings.username, decrypted_password),
-                headers=headers,
-                json=payload,
-                verify=False,
-                timeout=600,
+    workers = min(len(states), MAX_SYNC_WORKERS)
+    pages = queue.Queue(maxsize=workers * 2)
+    stop = threading.Event()
+    pending = len(states)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="biometric-sync") as pool:
+        for key, state in states.items():
+            pool.submit(
+                _fetch_device_pages, key, state.client, state.start_time, state.end_time,
+                state.position, state.page_size, pages, stop, state.user_directory is None,
             )
 
-            if response.status_code != 200:
-                frappe.publish_progress(100, title="Attendance Sync", description=f"Failed to fetch attendance logs. Status: {response.status_code}")
-                frappe.throw(f"Failed to fetch attendance logs. Status: {response.status_code}, Response: {response.text}")
+        try:
+            while pending:
+                kind, key, payload = pages.get()
+                state = states[key]
+
+                if kind == "done":
+                    pending -= 1
+                    continue
 
-            data = response.json()
-            events = data.get("AcsEvent", {}).get("InfoList", [])
+                if kind == "error":
+                    state.error = payload
+                    continue
 
-            if not events:
-                break
+                if kind == "directory":
+                    # Names are cosmetic, a failed directory download must not stop the punch sync
+                    if isinstance(payload, Exception):
+                        frappe.log_error(f"Device user directory fetch failed: {str(payload)}", "Biometric User Directory")
+                        payload = {}
+                    else:
+                        cache_user_directory(state.client, payload)
+                    state.user_directory = payload
+                    continue
 
-            for log in events:
-                emp_no = log.get("employeeNoString")
-                event_timestamp = log.get("time", "")
-                if not emp_no or not event_timestamp:
+                # Pages still queued after a cancel are dropped; the checkpoint only covers
+                # pages that were actually ingested
+                if stop.is_set():
                     continue
 
-                event_datetime = datetime.strptime(event_timestamp[:19], "%Y-%m-%dT%H:%M:%S")
-                employee_name = _get_employee_name(settings, decrypted_password, emp_no, employee_name_cache)
+                events, state.position, state.total, state.page_size, state.page_seconds = payload
+
+                # Someone enrolled since the directory was cached; numbers the device no longer
+                # knows are remembered per device and do not trigger another download
+                if not state.directory_refreshed:
+                    directory = _refresh_user_directory(state.client, state.user_directory, events)
+                    state.directory_refreshed = directory is not state.user_directory
+                    state.user_directory = directory
+
+                fresh_events = _drop_seen_events(
+                    events, state.overlap_start, state.seen_time, state.seen_serial
+                )
+                counts["skipped"] += len(events) - len(fresh_events)
+
+                result = _ingest_events(fresh_events, state.user_directory)
+                counts["synced"] += result["added"]
+                counts["skipped"] += result["skipped"]
+                counts["failed"] += result["failed"]
 
-                attendance_log = frappe.get_all(
-                    "Biometric Attendance Log",
-                    filters={"employee_no": emp_no, "event_date": event_datetime.date()},
-                    limit_page_length=1,
+                state.watermark_time, state.watermark_serial = _advance_watermark(
+                    fresh_events, state.watermark_time, state.watermark_serial
                 )
+                device_state = {"sync_checkpoint_window": state.window, "sync_checkpoint_position": state.position}
+                if state.watermark_time:
+                    device_state.update({
+                        "last_event_time": state.watermark_time,
+                        "last_event_serial_no": state.watermark_serial,
+                    })
+                _set_device_state(state.device, device_state)
+                frappe.db.commit()
 
-                if attendance_log:
-                    doc = frappe.get_doc("Biometric Attendance Log", attendance_log[0].name)
-                else:
-                    doc = frappe.new_doc("Biometric Attendance Log")
-                    doc.employee_no = emp_no
-                    doc.event_date = event_datetime.date()
-
-                if employee_name:
-                    doc.employee_name = employee_name
-
-                existing_punch = frappe.db.sql(
-                    """
-                    SELECT COUNT(*)
-                    FROM `tabBiometric Attendance Punch Table`
-                    WHERE parent = %(parent)s
-                    AND punch_time = %(punch_time)s
-                    """,
-                    {"parent": doc.name, "punch_time": event_datetime.time()},
-                )[0][0] > 0
-
-                if not existing_punch:
-                    doc.append(
-                        "punch_table",
-                        {
-                            "punch_time": event_datetime.time(),
-                            "punch_type": "Auto",
-                        },
+                if on_progress:
+                    on_progress(
+                        sum(s.position for s in states.values()),
+                        sum(s.total for s in states.values()),
+                        counts,
                     )
-                    try:
-                        doc.save(ignore_permissions=True)
-                        count += 1
-                    except Exception as e:
-                        print(f"Insert failed for employee {emp_no}: {str(e)}")
-                        continue
-                else:
-                    skipped += 1
-
-            position += len(events)
-            if len(events) < batch_size:
-                break
 
-        frappe.db.commit()
-        return f"{count} attendance records synced successfully. {skipped} duplicate punches skipped."
+                if should_stop and should_stop():
+                    counts["cancelled"] = True
+                    stop.set()
+        finally:
+            # Stop the workers and drain until each has posted "done", so none stays blocked
+            # on the full queue and the pool can shut down even when ingesting failed
+            stop.set()
+            while pending:
+                kind, _key, _payload = pages.get()
+                if kind == "done":
+                    pending -= 1
+
+    errors = []
+    for state in states.values():
+        if state.error:
+            errors.append(f"{_device_label(state.device)}: {str(state.error)}")
+            frappe.log_error(
+                f"Attendance sync failed for {_device_label(state.device)}: {str(state.error)}",
+                "Biometric Attendance Sync",
+            )
+        elif not counts["cancelled"]:
+            _set_device_state(state.device, {"sync_checkpoint_window": "", "sync_checkpoint_position": 0})
+        remember_page_size(settings, state.device.model, state.page_size, state.page_seconds)
+    frappe.db.commit()
+
+    if len(errors) == len(states):
+        raise Exception("Failed to fetch attendance logs. " + "; ".join(errors))
+
+    resumed_from = sum(state.resumed_from for state in states.values())
+    if counts["cancelled"]:
+        counts["message"] = (
+            f"Sync cancelled. {counts['synced']} attendance records synced. "
+            "Syncing the same range again resumes from there."
+        )
+    elif not counts["synced"] and not counts["skipped"] and not counts["failed"] and not resumed_from and not errors:
+        counts["message"] = "No attendance records found for the given time period."
+    else:
+        counts["message"] = (
+            f"{counts['synced']} attendance records synced successfully. "
+            f"{counts['skipped']} duplicate punches skipped."
+        )
+        if counts["failed"]:
+            counts["message"] += f" {counts['failed']} events could not be read."
+        if resumed_from:
+            counts["message"] += f" Resumed from event {resumed_from}."
+        if errors:
+            counts["message"] += " Failed devices: " + "; ".join(errors)
+
+    return counts
+
+@frappe.whitelist()
+def sync_attendance(from_date=None, from_time=None, to_date=None, to_time=None, incremental=0, background=0):
+    if cint(background):
+        return enqueue_attendance_sync(from_date, from_time, to_date, to_time, incremental)
+
+    try:
+        frappe.publish_progress(0, title="Attendance Sync", description="Starting attendance sync...")
+        return _sync_attendance(from_date, from_time, to_date, to_time, incremental)["message"]
     except Exception as e:
         frappe.throw(f"Error syncing attendance: {str(e)}")
 
 
-def scheduled_attendance_sync():
+# ── background sync ───────────────────────────────────────────────────────────
+
+def enqueue_attendance_sync(from_date=None, from_time=None, to_date=None, to_time=None, incremental=0):
+    """Hand the sync to a long-queue job and return its id straight away."""
+    if is_job_enqueued(SYNC_JOB_ID):
+        return {"status": "error", "message": "An attendance sync is already running."}
+
+    frappe.cache.delete_value(SYNC_CANCEL_KEY)
+    frappe.enqueue(
+        "biometric_integration.biometric_integration.doctype.biometric_integration_settings.biometric_integration_settings.run_attendance_sync_job",
+        queue="long",
+        timeout=SYNC_JOB_TIMEOUT,
+        job_id=SYNC_JOB_ID,
+        deduplicate=True,
+        from_date=from_date,
+        from_time=from_time,
+        to_date=to_date,
+        to_time=to_time,
+        incremental=incremental,
+    )
+    return {"status": "queued", "job_id": SYNC_JOB_ID, "message": "Attendance sync queued."}
+
+def _publish_sync_event(user, status, **data):
+    frappe.publish_realtime(SYNC_REALTIME_EVENT, {"status": status, "job_id": SYNC_JOB_ID, **data}, user=user)
+
+def run_attendance_sync_job(from_date=None, from_time=None, to_date=None, to_time=None, incremental=0):
+    user = frappe.session.user
+    _publish_sync_event(user, "started")
+
+    def on_progress(position, total_records, counts):
+        _publish_sync_event(
+            user, "progress", position=position, total=total_records,
+            synced=counts["synced"], skipped=counts["skipped"], failed=counts["failed"],
+        )
+
     try:
-        today_date = datetime.now().date()
-        yesterday_date = today_date - timedelta(days=1)
-        day_before_yesterday_date = today_date - timedelta(days=2)
-
-        sync_attendance(
-            from_date=str(day_before_yesterday_date),
-            from_time="00:00:00",
-            to_date=str(yesterday_date),
-            to_time="23:59:59"
+        result = _sync_attendance(
+            from_date, from_time, to_date, to_time, incremental,
+            on_progress=on_progress,
+            should_stop=lambda: bool(frappe.cache.get_value(SYNC_CANCEL_KEY)),
         )
+    except Exception as e:
+        frappe.log_error(f"Background attendance sync failed: {str(e)}", "Biometric Attendance Sync")
+        _publish_sync_event(user, "failed", message=f"Error syncing attendance: {str(e)}")
+        raise
+    finally:
+        frappe.cache.delete_value(SYNC_CANCEL_KEY)
+
+    _publish_sync_event(user, "cancelled" if result["cancelled"] else "completed", **result)
+
+@frappe.whitelist()
+def cancel_attendance_sync():
+    """Ask the running sync job to stop after the page it is processing."""
+    if not is_job_enqueued(SYNC_JOB_ID):
+        return {"status": "error", "message": "No attendance sync is running."}
+
+    frappe.cache.set_value(SYNC_CANCEL_KEY, 1, expires_in_sec=SYNC_JOB_TIMEOUT)
+    return {"status": "success", "message": "Cancellation requested. The sync stops after the current page."}
+
+
+def scheduled_attendance_sync():
+    try:
+        # Every device syncs from its own watermark up to now
+        sync_attendance(incremental=1)
 
         frappe.logger().info("Scheduled attendance sync started successfully")
 
@@ -446,65 +713,100 @@ def scheduled_attendance_sync():
 
 
 @frappe.whitelist()
-def update_all_manual_punches():
-    try:
-        manual_punches = frappe.get_all("Biometric Manual Punch", fields=["employee", "punch_date", "punch_time"])
-
-        for manual_punch in manual_punches:
-            employee = manual_punch["employee"]
-            punch_date = manual_punch["punch_date"]
-            punch_time = manual_punch["punch_time"]
-
-            attendance_device_id = frappe.db.get_value("Employee", employee, "attendance_device_id")
-            employee_name = frappe.db.get_value("Employee", employee, "employee_name")
-
-            if not attendance_device_id:
+def update_all_manual_punches(full=0):
+    """
+    Queue the manual punch reconciler instead of walking every manual punch inside the request.
+
+    With `full` every manual punch is read again from the start instead of from the cursor.
+    """
+    if is_job_enqueued(MANUAL_PUNCH_JOB_ID):
+        return {"status": "error", "message": "Manual punches are already being updated."}
+
+    enqueue_manual_punch_reconcile(full=cint(full))
+    return {"status": "queued", "message": "Manual punch update queued."}
+
+def enqueue_manual_punch_reconcile(enqueue_after_commit=False, full=0):
+    frappe.enqueue(
+        "biometric_integration.biometric_integration.doctype.biometric_integration_settings.biometric_integration_settings.reconcile_manual_punches",
+        queue="long",
+        job_id=MANUAL_PUNCH_JOB_ID,
+        deduplicate=True,
+        enqueue_after_commit=enqueue_after_commit,
+        full=full,
+    )
+
+def _get_manual_punch_batch(cursor, cursor_name, limit):
+    # Keyset on (modified, name): bulk-created punches share one modified timestamp
+    conditions = ""
+    if cursor:
+        conditions = "WHERE (mp.modified > %(cursor)s OR (mp.modified = %(cursor)s AND mp.name > %(cursor_name)s))"
+
+    return frappe.db.sql(f"""
+        SELECT mp.name, mp.modified, mp.punch_date, mp.punch_time,
+            e.attendance_device_id, e.employee_name
+        FROM `tabBiometric Manual Punch` mp
+        LEFT JOIN `tabEmployee` e ON e.name = mp.employee
+        {conditions}
+        ORDER BY mp.modified, mp.name
+        LIMIT %(limit)s
+    """, {"cursor": cursor, "cursor_name": cursor_name or "", "limit": limit}, as_dict=True)
+
+def reconcile_manual_punches(full=0):
+    """
+    Copy manual punches created or modified since the last run into the attendance logs.
+
+    Punches are read in (modified, name) order after the stored cursor (from the start with
+    `full`) and written per batch through the bulk punch store (one log lookup per device id
+    and date, duplicates skipped). The cursor is committed with each batch, so an interrupted
+    run resumes where it stopped. It never moves past a punch whose employee has no attendance
+    device id yet, so that punch is picked up once the id is set; the punches after it are
+    read again and skipped as duplicates.
+    """
+    settings = frappe._dict()
+    if not cint(full):
+        settings = frappe.db.get_value(
+            "Biometric Integration Settings", None,
+            ["manual_punch_cursor", "manual_punch_cursor_name"], as_dict=True,
+        ) or settings
+    cursor, cursor_name = settings.manual_punch_cursor, settings.manual_punch_cursor_name
+    stored = cursor, cursor_name
+    held = False
+    counts = {"added": 0, "skipped": 0, "no_device_id": 0}
+
+    while True:
+        rows = _get_manual_punch_batch(cursor, cursor_name, MANUAL_PUNCH_BATCH_SIZE)
+        if not rows:
+            break
+
+        punches = []
+        for row in rows:
+            if not row.attendance_device_id or not row.punch_date or row.punch_time is None:
+                counts["no_device_id"] += 1
+                held = True
                 continue
+            punches.append({
+                "employee_no": row.attendance_device_id,
+                "event_date": row.punch_date,
+                "punch_time": row.punch_time,
+                "employee_name": row.employee_name,
+            })
+            if not held:
+                stored = row.modified, row.name
+
+        result = bulk_add_punches(punches, punch_type="Manual")
+        counts["added"] += result["added"]
+        counts["skipped"] += result["skipped"]
+
+        cursor, cursor_name = rows[-1].modified, rows[-1].name
+        frappe.db.set_value(
+            "Biometric Integration Settings", "Biometric Integration Settings",
+            {"manual_punch_cursor": stored[0], "manual_punch_cursor_name": stored[1]},
+            update_modified=False,
+        )
+        frappe.db.commit()
 
-            if isinstance(punch_time, str):
-                punch_time = punch_time.split(".")[0]
-            elif isinstance(punch_time, timedelta):
-                punch_time = (datetime.min + punch_time).time()
-
-            punch_datetime = datetime.strptime(f"{punch_date} {punch_time}", "%Y-%m-%d %H:%M:%S")
-
-            query = """
-                SELECT name FROM `tabBiometric Attendance Log`
-                WHERE employee_no = %s AND event_date = %s
-            """
-            attendance_log = frappe.db.sql(query, (attendance_device_id, punch_date), as_dict=True)
-
-            if attendance_log:
-                doc = frappe.get_doc("Biometric Attendance Log", attendance_log[0].name)
-            else:
-                doc = frappe.get_doc({"doctype": "Biometric Attendance Log", "employee_no": attendance_device_id, "event_date": punch_date})
-
-            if employee_name:
-                doc.employee_name = employee_name
-
-            punches = []
-            for punch in doc.get("punch_table", []):
-                punch_time_value = punch.punch_time
-                if isinstance(punch_time_value, str):
-                    punch_time_value = datetime.strptime(punch_time_value, "%H:%M:%S").time()
-                elif isinstance(punch_time_value, timedelta):
-                    punch_time_value = (datetime.min + punch_time_value).time()
-                punches.append({"punch_time": punch_time_value, "punch_type": punch.punch_type})
-
-            if not any(p["punch_time"] == punch_datetime.time() for p in punches):
-                punches.append({"punch_time": punch_datetime.time(), "punch_type": "Manual"})
-                punches.sort(key=lambda x: x["punch_time"])
-
-                doc.set("punch_table", [])
-                for punch in punches:
-                    doc.append("punch_table", punch)
-
-                doc.save(ignore_permissions=True)
-                frappe.db.commit()
-
-        return {"status": "success", "message": "Manual punches updated successfully for all employees."}
-
-    except frappe.ValidationError as e:
-        return {"status": "error", "message": str(e)}
-    except Exception as e:
-        return {"status": "error", "message": f"Error updating manual punches: {str(e)}"}
\ No newline at end of file
+    frappe.logger().info(
+        f"Manual punch reconcile: {counts['added']} added, {counts['skipped']} already present, "
+        f"{counts['no_device_id']} without an attendance device id"
+    )
+    return counts
@@ -1,9 +1,109 @@
 # Copyright (c) 2025, NDV and Contributors
 # See license.txt
 
+import unittest
+from datetime import datetime
+
 # import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from biometric_integration.biometric_integration.doctype.biometric_integration_settings.biometric_integration_settings import (
+	ACS_EVENT_MAX_PAGE_SIZE,
+	_drop_seen_events,
+	iter_acs_event_pages,
+)
+
 
 class TestBiometricIntegrationSettings(FrappeTestCase):
 	pass
+
+
+class FakeAcsClient:
+	"""A device holding `total` events that returns at most `cap` per page."""
+
+	def __init__(self, total, cap, status=True, total_matches=True):
+		self.total = total
+		self.cap = cap
+		self.status = status
+		self.total_matches = total_matches
+		self.requested = []
+
+	def search_acs_events(self, cond, timeout=None):
+		position, max_results = cond["searchResultPosition"], cond["maxResults"]
+		self.requested.append(max_results)
+
+		end = min(position + min(max_results, self.cap), self.total)
+		data = {"InfoList": [{"serialNo": serial_no} for serial_no in range(position + 1, end + 1)]}
+		if self.status:
+			data["responseStatusStrg"] = "MORE" if end < self.total else "OK"
+		if self.total_matches:
+			data["totalMatches"] = self.total
+		return data
+
+
+def fetch_all(client):
+	events = []
+	for page, _, _, _, _ in iter_acs_event_pages(client, "start", "end"):
+		events.extend(page)
+	return [event["serialNo"] for event in events]
+
+
+class TestAcsEventPages(unittest.TestCase):
+	def test_status_firmware_capped(self):
+		client = FakeAcsClient(500, cap=30)
+		self.assertEqual(fetch_all(client), list(range(1, 501)))
+
+	def test_total_matches_firmware_capped(self):
+		# No responseStatusStrg: a capped page must not read as the last one
+		client = FakeAcsClient(500, cap=30, status=False)
+		self.assertEqual(fetch_all(client), list(range(1, 501)))
+		self.assertLessEqual(max(client.requested[2:]), 30)
+
+	def test_bare_firmware_never_outgrows_filled_page(self):
+		client = FakeAcsClient(500, cap=30, status=False, total_matches=False)
+		self.assertEqual(fetch_all(client), list(range(1, 501)))
+		self.assertEqual(set(client.requested), {30})
+
+	def test_page_size_grows_on_uncapped_device(self):
+		for status in (True, False):
+			client = FakeAcsClient(1000, cap=1000, status=status)
+			self.assertEqual(fetch_all(client), list(range(1, 1001)))
+			self.assertEqual(max(client.requested), ACS_EVENT_MAX_PAGE_SIZE)
+
+	def test_empty_range(self):
+		self.assertEqual(fetch_all(FakeAcsClient(0, cap=30)), [])
+
+
+def acs_event(time, serial_no):
+	return {"employeeNoString": "1", "time": time, "serialNo": serial_no}
+
+
+class TestDropSeenEvents(unittest.TestCase):
+	overlap_start = datetime(2026, 3, 2, 7, 50)
+	watermark_time = datetime(2026, 3, 2, 8, 0)
+
+	def drop(self, events, watermark_serial=120):
+		return _drop_seen_events(events, self.overlap_start, self.watermark_time, watermark_serial)
+
+	def test_drops_synced_events_inside_overlap(self):
+		events = [
+			acs_event("2026-03-02T07:55:00+05:30", 118),
+			acs_event("2026-03-02T08:00:00+05:30", 120),
+			acs_event("2026-03-02T08:00:00+05:30", 121),
+			acs_event("2026-03-02T08:03:00+05:30", 122),
+		]
+		self.assertEqual([event["serialNo"] for event in self.drop(events)], [121, 122])
+
+	def test_keeps_events_outside_overlap(self):
+		# Serial numbers reset after a device wipe; only the overlap window is trusted
+		events = [acs_event("2026-03-02T07:40:00+05:30", 5), acs_event("2026-03-02T08:10:00+05:30", 6)]
+		self.assertEqual(self.drop(events), events)
+
+	def test_keeps_events_without_serial_or_time(self):
+		events = [acs_event("2026-03-02T07:55:00+05:30", None), acs_event("", 100)]
+		self.assertEqual(self.drop(events), events)
+
+	def test_no_watermark_keeps_everything(self):
+		events = [acs_event("2026-03-02T07:55:00+05:30", 118)]
+		self.assertEqual(self.drop(events, watermark_serial=None), events)
+		self.assertEqual(_drop_seen_events(events, None, None, None), events)
@@ -2,19 +2,44 @@
 # For license information, please see license.txt
 
 import frappe
-from datetime import datetime, timedelta
+from datetime import datetime
 from frappe.model.document import Document
+from frappe.utils import get_time, getdate, now
+from biometric_integration.biometric_integration.attendance_compute import seconds_to_time, time_to_seconds
+from biometric_integration.biometric_integration.doctype.biometric_attendance_log.biometric_attendance_log import (
+    add_punch,
+    bulk_add_punches,
+    refresh_total_hours,
+)
+from biometric_integration.biometric_integration.doctype.biometric_integration_settings.biometric_integration_settings import (
+    enqueue_manual_punch_reconcile,
+)
+
+MANUAL_PUNCH_BATCH_SIZE = 500
 
 class BiometricManualPunch(Document):
     def before_save(self):
         pass  # add pre-save validation logic here if needed
 
     def after_insert(self):
+        if frappe.flags.in_import:
+            # Data Import only stores the records; the manual punch reconciler then writes
+            # them to the attendance logs grouped per log with one commit per batch
+            self.validate_attendance_device_id()
+            enqueue_manual_punch_reconcile(enqueue_after_commit=True)
+            return
         add_manual_punch(self.employee, self.punch_date, self.punch_time)
 
     def on_update(self):
+        if frappe.flags.in_import:
+            return
         add_manual_punch(self.employee, self.punch_date, self.punch_time)
 
+    def validate_attendance_device_id(self):
+        # Fail the import row when the employee cannot be mapped to a device id
+        if not frappe.db.get_value("Employee", self.employee, "attendance_device_id"):
+            frappe.throw(f"Attendance Device ID not found for employee {self.employee}")
+
 @frappe.whitelist()
 def add_manual_punch(employee, punch_date, punch_time):
     try:
@@ -25,42 +50,12 @@ def add_manual_punch(employee, punch_date, punch_time):
             return {'status': 'error', 'message': f"Attendance Device ID not found for {employee_name}"}
 
         # Remove fractional seconds, if any, from punch_time
-        punch_time = punch_time.split('.')[0]
+        punch_time = str(punch_time).split('.')[0]
         punch_datetime = datetime.strptime(f"{punch_date} {punch_time}", '%Y-%m-%d %H:%M:%S')
 
-        query = """
-            SELECT name FROM `tabBiometric Attendance Log`
-            WHERE employee_no = %s AND event_date = %s
-        """
-        attendance_log = frappe.db.sql(query, (attendance_device_id, punch_datetime.date()), as_dict=True)
-
-        if attendance_log:
-            doc = frappe.get_doc('Biometric Attendance Log', attendance_log[0].name)
-        else:
-            doc = frappe.get_doc({'doctype': 'Biometric Attendance Log', 'employee_no': attendance_device_id, 'event_date': punch_datetime.date()})
-
-        punches = []
-        for punch in doc.get('punch_table', []):
-            punch_time_value = punch.punch_time
-            if isinstance(punch_time_value, str):
-                punch_time_value = datetime.strptime(punch_time_value, '%H:%M:%S').time()
-            elif isinstance(punch_time_value, timedelta):
-                punch_time_value = (datetime.min + punch_time_value).time()
-            punches.append({'punch_time': punch_time_value, 'punch_type': punch.punch_type})
-
-        # Check if the punch time already exists (ignoring fractional seconds)
-        if any(p['punch_time'] == punch_datetime.time() for p in punches):
+        if not add_punch(attendance_device_id, punch_datetime.date(), punch_datetime.time(),
+                         punch_type='Manual', employee_name=employee_name):
             return {'status': 'error', 'message': f"Manual punch for {employee_name} on {punch_date} at {punch_time} already exists. Document will not be saved."}
-        
-        punches.append({'punch_time': punch_datetime.time(), 'punch_type': 'Manual'})
-        punches.sort(key=lambda x: x['punch_time'])
-
-        doc.set('punch_table', [])
-        for punch in punches:
-            doc.append('punch_table', punch)
-
-        doc.save(ignore_permissions=True)
-        frappe.db.commit()
 
         return {'status': 'success', 'message': f"Manual punch for {employee_name} on {punch_date} at {punch_time} added successfully."}
 
@@ -69,6 +64,109 @@ def add_manual_punch(employee, punch_date, punch_time):
     except Exception as e:
         return {'status': 'error', 'message': f"Error adding manual punch: {str(e)}"}
 
+@frappe.whitelist()
+def add_manual_punches(punches):
+    """
+    Add many manual punches at once, e.g. a week of missed punches from a spreadsheet.
+
+    `punches` is a list (or JSON string) of {employee, punch_date, punch_time}. Device ids
+    are resolved with one Employee query, every batch appends only the new punch rows to
+    the attendance logs, creates the Biometric Manual Punch records and commits once.
+    Returns the totals and a per-row result list (row numbers are 1-based).
+    """
+    frappe.has_permission("Biometric Manual Punch", "create", throw=True)
+
+    punches = frappe.parse_json(punches) or []
+    results = {}
+
+    employees = {
+        employee.name: employee
+        for employee in frappe.get_all(
+            "Employee",
+            filters={"name": ["in", list({punch.get("employee") for punch in punches if punch.get("employee")})]},
+            fields=["name", "employee_name", "attendance_device_id"],
+        )
+    } if punches else {}
+
+    valid_rows = []
+    for row_no, punch in enumerate(punches, 1):
+        employee = employees.get(punch.get("employee"))
+        if not employee:
+            results[row_no] = {"status": "error", "message": f"Employee {punch.get('employee')} not found"}
+            continue
+        if not employee.attendance_device_id:
+            results[row_no] = {"status": "error", "message": f"Attendance Device ID not found for {employee.employee_name}"}
+            continue
+
+        try:
+            punch_date = getdate(punch.get("punch_date"))
+            seconds = time_to_seconds(get_time(punch.get("punch_time")))
+        except Exception:
+            results[row_no] = {"status": "error", "message": "Invalid punch date or time"}
+            continue
+
+        valid_rows.append((row_no, employee, punch_date, seconds))
+
+    for start in range(0, len(valid_rows), MANUAL_PUNCH_BATCH_SIZE):
+        batch = valid_rows[start:start + MANUAL_PUNCH_BATCH_SIZE]
+        try:
+            _add_manual_punch_batch(batch, results)
+            frappe.db.commit()
+        except Exception as e:
+            frappe.db.rollback()
+            frappe.log_error(f"Bulk manual punch batch failed: {str(e)}", "Biometric Manual Punch Import")
+            for row_no, *_ in batch:
+                results[row_no] = {"status": "error", "message": f"Error adding manual punch: {str(e)}"}
+
+    rows = [{"row": row_no, **results[row_no]} for row_no in sorted(results)]
+    return {
+        "added": sum(1 for row in rows if row["status"] == "success"),
+        "skipped": sum(1 for row in rows if row["status"] == "skipped"),
+        "failed": sum(1 for row in rows if row["status"] == "error"),
+        "rows": rows,
+    }
+
+def _add_manual_punch_batch(batch, results):
+    result = bulk_add_punches([
+        {
+            "employee_no": employee.attendance_device_id,
+            "event_date": punch_date,
+            "punch_time": seconds_to_time(seconds),
+            "employee_name": employee.employee_name,
+        }
+        for _row_no, employee, punch_date, seconds in batch
+    ], punch_type="Manual")
+
+    inserted = set(result["inserted"])
+    timestamp = now()
+    user = frappe.session.user
+    manual_punches = []
+
+    for row_no, employee, punch_date, seconds in batch:
+        key = (str(employee.attendance_device_id), punch_date, seconds)
+        if key not in inserted:
+            results[row_no] = {
+                "status": "skipped",
+                "message": f"Punch for {employee.employee_name} on {punch_date} at {seconds_to_time(seconds)} already exists",
+            }
+            continue
+
+        # Only the first row of a repeated punch claims it
+        inserted.discard(key)
+        manual_punches.append((
+            frappe.generate_hash(length=10), user, timestamp, timestamp, user, 0,
+            employee.name, punch_date, seconds_to_time(seconds),
+        ))
+        results[row_no] = {"status": "success", "message": f"Manual punch added for {employee.employee_name}"}
+
+    if manual_punches:
+        frappe.db.bulk_insert(
+            "Biometric Manual Punch",
+            fields=["name", "owner", "creation", "modified", "modified_by", "docstatus",
+                    "employee", "punch_date", "punch_time"],
+            values=manual_punches,
+        )
+
 @frappe.whitelist()
 def edit_button_delete_punch(doc_name, new_punch_date, new_punch_time):
     try:
@@ -98,6 +196,7 @@ def edit_button_delete_punch(doc_name, new_punch_date, new_punch_time):
             DELETE FROM `tabBiometric Attendance Punch Table` 
             WHERE parent = %s AND punch_time = %s AND punch_type = 'Manual'
         """, (attendance_log_name, punch_time))
+        refresh_total_hours([attendance_log_name])
 
         # Update the punch date and time in the Biometric Manual Punch table
         frappe.db.sql("""
@@ -145,6 +244,7 @@ def delete_manual_punch(doc, method=None):
             DELETE FROM `tabBiometric Attendance Punch Table` 
             WHERE parent = %s AND punch_time = %s AND punch_type = 'Manual'
         """, (attendance_log_name, punch_time))
+        refresh_total_hours([attendance_log_name])
 
         frappe.db.commit()
 
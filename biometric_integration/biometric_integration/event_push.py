@@ -0,0 +1,156 @@
+# Copyright (c) 2026, NDV and contributors
+# For license information, please see license.txt
+
+"""
+Ingestion of events pushed by terminals in HTTP listening (alarm host) mode.
+
+Terminals POST each access event to `receive_event`. The endpoint only authenticates the
+device and appends the event to a Redis list; a deduplicated background job drains the
+list in micro-batches through the bulk punch store, so a burst at shift change costs a
+handful of set-based writes instead of one document save per punch.
+"""
+
+import json
+import secrets
+
+import frappe
+
+from biometric_integration.biometric_integration.doctype.biometric_integration_settings.biometric_integration_settings import (
+    _ingest_events,
+)
+
+PUSH_BUFFER_KEY = "biometric_push_events"
+PUSH_FLUSH_JOB_ID = "biometric_push_flush"
+PUSH_FLUSH_BATCH_SIZE = 200
+PUSH_TOKEN_HEADER = "X-Biometric-Token"
+
+# Access granted by face / card / fingerprint; the same filter the AcsEvent poll uses
+ACCESS_EVENT_MAJOR = 5
+ACCESS_EVENT_MINOR = 75
+
+
+def _get_pushing_device(token):
+    """Return the device document whose push token matches, or None."""
+    if not token:
+        return None
+
+    device = frappe.db.get_value("Biometric Device", {"push_token": token, "enabled": 1}, "name")
+    if device:
+        return frappe.get_doc("Biometric Device", device)
+
+    settings_token = frappe.db.get_single_value("Biometric Integration Settings", "push_token")
+    if settings_token and secrets.compare_digest(settings_token, token):
+        return frappe.get_doc("Biometric Integration Settings", "Biometric Integration Settings")
+
+    return None
+
+
+def _read_event_payloads():
+    """
+    Yield the JSON event documents of the current request.
+
+    Terminals send either a plain JSON body or multipart/form-data with the event JSON in
+    one part (usually `event_log`) next to the face picture, which is ignored here.
+    """
+    request = frappe.request
+
+    if request.mimetype == "application/json":
+        yield request.get_json(silent=True) or {}
+        return
+
+    parts = list(request.form.values())
+    parts.extend(
+        file.read().decode("utf-8", "ignore")
+        for file in request.files.values()
+        if file.mimetype == "application/json" or (file.filename or "").endswith(".json")
+    )
+
+    for part in parts:
+        try:
+            payload = json.loads(part)
+        except (TypeError, ValueError):
+            continue
+        if isinstance(payload, dict):
+            yield payload
+
+
+def normalize_event(payload):
+    """Map a pushed event onto the AcsEvent InfoList shape the sync already ingests."""
+    event = payload.get("AccessControllerEvent")
+    if not isinstance(event, dict):
+        return None
+
+    if event.get("majorEventType") != ACCESS_EVENT_MAJOR or event.get("subEventType") != ACCESS_EVENT_MINOR:
+        return None
+
+    emp_no = event.get("employeeNoString") or event.get("employeeNo")
+    if not emp_no or not payload.get("dateTime"):
+        return None
+
+    return {
+        "employeeNoString": str(emp_no),
+        "name": event.get("name") or "",
+        "time": payload["dateTime"],
+        "serialNo": event.get("serialNo"),
+    }
+
+
+@frappe.whitelist(allow_guest=True, methods=["POST"])
+def receive_event(token=None):
+    """Buffer the access events pushed by a terminal. Heartbeats and other event types are acknowledged and dropped."""
+    token = token or frappe.get_request_header(PUSH_TOKEN_HEADER)
+    if not _get_pushing_device(token):
+        frappe.throw("Invalid push token.", frappe.AuthenticationError)
+
+    events = [event for event in map(normalize_event, _read_event_payloads()) if event]
+    if events:
+        _buffer_events(events)
+        enqueue_push_flush()
+
+    return {"status": "success", "buffered": len(events)}
+
+
+def enqueue_push_flush():
+    # While a flush is queued further pushes only extend the buffer, which is what batches a burst
+    frappe.enqueue(
+        "biometric_integration.biometric_integration.event_push.flush_pushed_events",
+        queue="short",
+        job_id=PUSH_FLUSH_JOB_ID,
+        deduplicate=True,
+    )
+
+
+def _buffer_events(events):
+    with frappe.cache.pipeline() as pipe:
+        pipe.rpush(frappe.cache.make_key(PUSH_BUFFER_KEY), *[json.dumps(event) for event in events])
+        pipe.execute()
+
+
+def _pop_buffered_events(limit):
+    key = frappe.cache.make_key(PUSH_BUFFER_KEY)
+    with frappe.cache.pipeline() as pipe:
+        pipe.lrange(key, 0, limit - 1)
+        pipe.ltrim(key, limit, -1)
+        raw_events, _ = pipe.execute()
+
+    return [json.loads(raw) for raw in raw_events]
+
+
+def flush_pushed_events():
+    """Drain the push buffer into Biometric Attendance Log, one micro-batch per commit."""
+    while True:
+        events = _pop_buffered_events(PUSH_FLUSH_BATCH_SIZE)
+        if not events:
+            return
+
+        try:
+            # Pushed events carry the enrolled name, so no device directory lookup is needed
+            names = {event["employeeNoString"]: event["name"] for event in events if event.get("name")}
+            _ingest_events(events, names)
+            frappe.db.commit()
+        except Exception as e:
+            frappe.db.rollback()
+            # Put the batch back so the next flush retries it; duplicates are skipped on ingest
+            _buffer_events(events)
+            frappe.log_error(f"Pushed event flush failed: {e!s}", "Biometric Event Push")
+            return
@@ -1,6 +1,13 @@
 // Copyright (c) 2025, NDV and contributors
 // For license information, please see license.txt
 
+// Colours for the per-cell status codes the report sends in `cell_status`
+const DAILY_REPORT_CELL_COLORS = {
+    check: "#ffff00",   // odd punches / "<-- Check"
+    manual: "red",      // manual punch
+    flag: "red",        // early leave to review
+};
+
 frappe.query_reports["Biometric Daily Report"] = {
     filters: [
         {
@@ -11,6 +18,15 @@ frappe.query_reports["Biometric Daily Report"] = {
         }
     ],
 
+    formatter: function (value, row, column, data, default_formatter) {
+        value = default_formatter(value, row, column, data);
+        const status = data && data.cell_status && data.cell_status[column.fieldname];
+        if (status && DAILY_REPORT_CELL_COLORS[status]) {
+            value = `<span style="color: ${DAILY_REPORT_CELL_COLORS[status]}">${value}</span>`;
+        }
+        return value;
+    },
+
     onload: function (report) {
         report.page.add_inner_button(__("Copy Absent"), function () {
             _copy_report_clipboard(report, true);
@@ -29,10 +45,9 @@ function _build_report_canvas(report, rows) {
         return String(val).replace(/<[^>]*>/g, "").trim();
     }
 
-    function extract_color(val) {
-        if (!val || typeof val !== "string") return null;
-        const m = val.match(/color\s*:\s*([^;"'<>]+)/i);
-        return m ? m[1].trim() : null;
+    function cell_color(row, fieldname) {
+        const status = row.cell_status && row.cell_status[fieldname];
+        return status ? DAILY_REPORT_CELL_COLORS[status] : null;
     }
 
     const DPR = 2;
@@ -149,7 +164,7 @@ function _build_report_canvas(report, rows) {
             } else {
                 const raw = row[col.fieldname];
                 text = strip_html(raw);
-                color = extract_color(typeof raw === "string" ? raw : "") || TEXT_DEFAULT;
+                color = cell_color(row, col.fieldname) || TEXT_DEFAULT;
             }
 
             ctx.fillStyle = color;
@@ -80,6 +80,22 @@ frappe.query_reports["Biometric Monthly Report"] = {
 
     refresh: function(report) {
         report.set_filter_value("total_hours_hh_mm", 0);
+
+        ["xlsx", "csv"].forEach(function(file_format) {
+            report.page.add_inner_button(__("Export {0}", [file_format.toUpperCase()]), function() {
+                const filters = report.get_filter_values(true);
+                if (!filters) return;
+
+                open_url_post(
+                    "/api/method/biometric_integration.biometric_integration.report.biometric_monthly_report.biometric_monthly_report.export_month_grid",
+                    {
+                        year: filters.year,
+                        month: filters.month,
+                        file_format: file_format,
+                    }
+                );
+            }, __("Export Grid"));
+        });
     },
 };
 
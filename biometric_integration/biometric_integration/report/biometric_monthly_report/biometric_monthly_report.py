@@ -1,17 +1,35 @@
+import csv
+import tempfile
 import frappe
 from frappe import _
 from calendar import monthrange
+from io import TextIOWrapper
+from openpyxl import Workbook
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import wrap_file
 from datetime import datetime, timedelta
+from frappe.utils import add_months, getdate, today
+from biometric_integration.biometric_integration.attendance_archive import get_archived_day_punches, get_archived_months
+from biometric_integration.biometric_integration.attendance_cache import get_cached_month, set_cached_month
+from biometric_integration.biometric_integration.attendance_compute import (
+    format_decimal_hours,
+    format_minutes_to_hhmm,
+    seconds_to_time,
+    summarize_punches,
+    time_to_seconds,
+)
+from biometric_integration.biometric_integration.scheduled_reports import prepare_report_for_users
 
 @frappe.whitelist()
 def get_attendance_years():
     """Return list of years for which attendance records exist."""
-    years = frappe.db.sql("""
+    years = frappe.db.sql_list("""
         SELECT DISTINCT YEAR(event_date) as attendance_year
         FROM `tabBiometric Attendance Log`
-        ORDER BY attendance_year DESC
     """)
-    return "\n".join([str(year[0]) for year in years]) or \
+    # Archived months can still be opened
+    years = sorted(set(years) | {year for year, _month in get_archived_months()}, reverse=True)
+    return "\n".join([str(year) for year in years]) or \
         "\n".join([str(year) for year in range(datetime.now().year, datetime.now().year - 5, -1)])
 
 def execute(filters=None):
@@ -39,6 +57,12 @@ def execute(filters=None):
     filters['date_range'] = [from_date_str, to_date_str]
     filters['total_hours_hh_mm'] = True
     
+    # Repeat views of a month are served from the cache until its punches change
+    cache_field = f"{filters.get('employee') or ''}|{1 if total_hours_hh_mm else 0}"
+    cached = get_cached_month(year, month, cache_field)
+    if cached:
+        return cached
+    
     # Create columns for employee details
     columns = [
         {"fieldname": "employee_name", "label": _("Employee Name"), "fieldtype": "Data", "width": 200, "align": "left"},
@@ -125,7 +149,12 @@ def execute(filters=None):
         # Fallback to simple string sorting if natural sort fails
         employees.sort(key=lambda emp: str(emp.get("employee_no") or ""))
     
+    daily_minutes = get_daily_minutes(
+        [employee.employee_no for employee in employees if employee.employee_no], from_date_str, to_date_str
+    )
+    
     data = []
+    date_totals = [0] * len(date_list)
     
     # Process each employee's attendance
     for employee in employees:
@@ -135,61 +164,19 @@ def execute(filters=None):
             "employee_department": employee.department_name,
             "employee_id": employee.employee_no,
         }
-        total_employee_duration = timedelta()
+        total_employee_minutes = 0
         
         # Loop through each date in the selected range
-        for date in date_list:
-            date_str = date.strftime('%Y-%m-%d')
-            
-            # Get attendance logs for the given date
-            attendance_logs = frappe.db.sql("""
-                SELECT al.name
-                FROM `tabBiometric Attendance Log` al
-                WHERE al.employee_no = %(employee_no)s 
-                AND al.event_date = %(date)s
-            """, {
-                "employee_no": employee.employee_no,
-                "date": date_str
-            }, as_dict=True)
-            
-            valid_durations = []
-            
-            for log in attendance_logs:
-                # Fetch punches
-                punches = frappe.db.sql("""
-                    SELECT at.punch_time
-                    FROM `tabBiometric Attendance Punch Table` at
-                    WHERE at.parent = %(log_name)s
-                    ORDER BY at.punch_time
-                """, {"log_name": log.name}, as_dict=True)
-                
-                # Skip if no punches exist
-                if not punches:
-                    continue
-                
-                # Make decisions about punches
-                if len(punches) >= 2:  # Need at least one in-out pair
-                    # If odd number of punches, ignore the last one
-                    if len(punches) % 2 != 0:
-                        punches = punches[:-1]
-                    
-                    duration = calculate_total_minutes(punches)
-                    if duration > 0:
-                        valid_durations.append(duration)
+        for i, date in enumerate(date_list):
+            total_duration = daily_minutes.get((employee.employee_no, date.date()), 0)
+            total_employee_minutes += total_duration
+            date_totals[i] += total_duration
             
-            # Calculate the total duration for the day
-            if valid_durations:
-                total_duration = sum(valid_durations)
-                formatted_duration = format_minutes_to_hhmm(total_duration)
-                total_employee_duration += timedelta(minutes=total_duration)
-            else:
-                formatted_duration = "00:00"
-            
-            row[f"duration_{date.strftime('%Y%m%d')}"] = formatted_duration
+            row[f"duration_{date.strftime('%Y%m%d')}"] = format_minutes_to_hhmm(total_duration)
         
         # Format total duration for the employee
-        row["total_duration"] = format_minutes_to_hhmm(int(total_employee_duration.total_seconds() / 60))
-        row["total_duration_decimal"] = format_decimal_duration(total_employee_duration)
+        row["total_duration"] = format_minutes_to_hhmm(total_employee_minutes)
+        row["total_duration_decimal"] = format_decimal_hours(total_employee_minutes)
         
         # Include all active employees
         data.append(row)
@@ -199,55 +186,133 @@ def execute(filters=None):
         "employee_name": "Total",
         "employee_id": len(data),  # Count of active employees included in the report
     }
-    total_minutes_all = 0
-    
-    for date in date_list:
-        date_key = f"duration_{date.strftime('%Y%m%d')}"
-        total_minutes = 0
-        
-        for row in data:
-            if row.get(date_key) and row[date_key] != "00:00":
-                hours, minutes = map(int, row[date_key].split(':'))
-                total_minutes += hours * 60 + minutes
-        
-        hours = total_minutes // 60
-        minutes = total_minutes % 60
-        total_row[date_key] = f"{hours:02d}:{minutes:02d}"
-        total_minutes_all += total_minutes
+    for date, total_minutes in zip(date_list, date_totals, strict=True):
+        total_row[f"duration_{date.strftime('%Y%m%d')}"] = format_minutes_to_hhmm(total_minutes)
     
     # Calculate overall total duration
-    hours_all = total_minutes_all // 60
-    minutes_all = total_minutes_all % 60
-    total_row["total_duration"] = f"{hours_all:02d}:{minutes_all:02d}"
-    total_row["total_duration_decimal"] = f"{hours_all + (minutes_all / 60):.2f}"
+    total_minutes_all = sum(date_totals)
+    total_row["total_duration"] = format_minutes_to_hhmm(total_minutes_all)
+    total_row["total_duration_decimal"] = f"{total_minutes_all / 60:.2f}"
     
     data.append(total_row)
     
+    set_cached_month(year, month, cache_field, (columns, data))
+    
     return columns, data
 
-def calculate_total_minutes(punches):
-    total_minutes = 0
-    
-    for i in range(0, len(punches) - 1, 2):
-        try:
-            punch_in = punches[i]["punch_time"]
-            punch_out = punches[i + 1]["punch_time"]
-            
-            minutes_diff = int(punch_out.total_seconds() / 60) - int(punch_in.total_seconds() / 60)
-            total_minutes += minutes_diff
-        except Exception:
-            return 0
-    
-    return total_minutes
+@frappe.whitelist()
+def export_month_grid(year, month, file_format="xlsx"):
+    """
+    Download the month grid as XLSX or CSV without the generic report export.
 
-def format_minutes_to_hhmm(minutes):
-    hours, mins = divmod(minutes, 60)
-    return f"{hours:02}:{mins:02}"
+    The grid comes from the month cache (or is built once into it) and is written row by
+    row to a temporary file, through openpyxl's write-only mode for XLSX, which is then
+    streamed to the client in chunks instead of being built up in memory.
+    """
+    if not frappe.get_doc("Report", "Biometric Monthly Report").is_permitted():
+        frappe.throw(_("Not permitted to export the Biometric Monthly Report"), frappe.PermissionError)
 
-def format_decimal_duration(duration):
-    total_minutes = int(duration.total_seconds() // 60)
-    hours = total_minutes // 60
-    minutes_fraction = total_minutes % 60 / 60  # Convert remaining minutes to fraction
-    
-    result = hours + minutes_fraction  # Sum both values
-    return f"{result:.4f}"  # Format to exactly 4 decimal places
\ No newline at end of file
+    columns, data = execute(frappe._dict(year=year, month=month, total_hours_hh_mm=1))
+    fieldnames = [column["fieldname"] for column in columns]
+    header = [column["label"] for column in columns]
+    filename = f"Biometric Monthly Report {int(year)}-{int(month):02d}"
+
+    # Removed by the OS once the response has been sent and the file closed
+    content = tempfile.TemporaryFile()
+
+    if file_format == "csv":
+        text = TextIOWrapper(content, encoding="utf-8", newline="")
+        writer = csv.writer(text)
+        writer.writerow(header)
+        for row in data:
+            writer.writerow([row.get(fieldname) for fieldname in fieldnames])
+        text.flush()
+        text.detach()
+
+        filename, mimetype = f"{filename}.csv", "text/csv"
+    else:
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Monthly Report")
+        sheet.append(header)
+        for row in data:
+            sheet.append([row.get(fieldname) for fieldname in fieldnames])
+        workbook.save(content)
+
+        filename = f"{filename}.xlsx"
+        mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+    content.seek(0)
+    response = Response(wrap_file(frappe.local.request.environ, content), direct_passthrough=True)
+    response.mimetype = mimetype
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+def prepare_previous_month_report():
+    """
+    Scheduled on the 1st: get last month's report ready for month-end payroll.
+
+    The month cache is shared by every user, so it is warmed here for both total formats;
+    Prepared Reports are per owner and are queued for each user who runs the report.
+    """
+    previous_month = add_months(getdate(today()), -1)
+    for total_hours_hh_mm in (0, 1):
+        execute(frappe._dict(
+            year=previous_month.year, month=previous_month.month, total_hours_hh_mm=total_hours_hh_mm
+        ))
+
+    prepare_report_for_users("Biometric Monthly Report", {
+        "year": str(previous_month.year),
+        "month": str(previous_month.month),
+    }, view_filters=("total_hours_hh_mm",))
+
+def get_daily_minutes(employee_nos, from_date, to_date):
+    """
+    Worked minutes per (employee_no, event_date) for the whole range, read from the day
+    summary stored on each attendance log and from the archives of months moved out of
+    the hot tables.
+
+    Days without a complete in-out pair are left out, matching the "00:00" cells of the report.
+    """
+    if not employee_nos:
+        return {}
+
+    params = {
+        "from_date": from_date,
+        "to_date": to_date,
+        "employee_nos": tuple(set(employee_nos)),
+    }
+    # Archived months come back from their files only when the range reaches them
+    archived_days = get_archived_day_punches(employee_nos, from_date, to_date)
+
+    daily_minutes = {}
+    for log in frappe.db.sql("""
+        SELECT employee_no, event_date, SUM(worked_minutes) AS worked_minutes
+        FROM `tabBiometric Attendance Log`
+        WHERE event_date BETWEEN %(from_date)s AND %(to_date)s
+        AND employee_no IN %(employee_nos)s
+        AND worked_minutes > 0
+        GROUP BY employee_no, event_date
+    """, params, as_dict=True):
+        if (str(log.employee_no), log.event_date) not in archived_days:
+            daily_minutes[(log.employee_no, log.event_date)] = int(log.worked_minutes)
+
+    if archived_days:
+        # A day back in the hot tables after its month was archived (an edited old manual
+        # punch, a re-synced range) is worked out from the archived and hot punches together
+        for punch in frappe.db.sql("""
+            SELECT l.employee_no, l.event_date, p.punch_time
+            FROM `tabBiometric Attendance Log` l
+            INNER JOIN `tabBiometric Attendance Punch Table` p ON p.parent = l.name
+            WHERE l.event_date BETWEEN %(from_date)s AND %(to_date)s
+            AND l.employee_no IN %(employee_nos)s
+        """, params, as_dict=True):
+            day = archived_days.get((str(punch.employee_no), punch.event_date))
+            if day is not None:
+                day.add(time_to_seconds(punch.punch_time))
+
+        for key, seconds in archived_days.items():
+            worked_minutes = summarize_punches([seconds_to_time(value) for value in sorted(seconds)]).worked_minutes
+            if worked_minutes > 0:
+                daily_minutes[key] = worked_minutes
+
+    return daily_minutes
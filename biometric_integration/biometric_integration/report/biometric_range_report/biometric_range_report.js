@@ -0,0 +1,39 @@
+// Copyright (c) 2026, NDV and contributors
+// For license information, please see license.txt
+
+frappe.query_reports["Biometric Range Report"] = {
+    filters: [
+        {
+            fieldname: "from_date",
+            label: __("From Date"),
+            fieldtype: "Date",
+            reqd: 1,
+            // Payroll periods run from the 21st of the previous month
+            default: frappe.datetime.add_days(frappe.datetime.add_months(frappe.datetime.month_start(), -1), 20),
+        },
+        {
+            fieldname: "to_date",
+            label: __("To Date"),
+            fieldtype: "Date",
+            reqd: 1,
+            default: frappe.datetime.add_days(frappe.datetime.month_start(), 19),
+        },
+        {
+            fieldname: "department",
+            label: __("Department"),
+            fieldtype: "Link",
+            options: "Department",
+        },
+        {
+            fieldname: "employee",
+            label: __("Employee"),
+            fieldtype: "Link",
+            options: "Employee",
+        },
+        {
+            fieldname: "daily_breakdown",
+            label: __("Daily Breakdown"),
+            fieldtype: "Check",
+        },
+    ],
+};
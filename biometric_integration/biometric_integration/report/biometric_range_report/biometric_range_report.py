@@ -0,0 +1,212 @@
+from datetime import timedelta
+
+import frappe
+from frappe import _
+from frappe.utils import add_days, add_months, date_diff, getdate, today
+
+from biometric_integration.biometric_integration.attendance_archive import get_archived_day_punch_types
+from biometric_integration.biometric_integration.attendance_compute import (
+    format_decimal_hours,
+    format_minutes_to_hhmm,
+    seconds_to_time,
+    summarize_punches,
+    time_to_seconds,
+)
+from biometric_integration.biometric_integration.scheduled_reports import prepare_report_for_users
+
+MAX_RANGE_DAYS = 366
+
+def execute(filters=None):
+    filters = frappe._dict(filters or {})
+    if not filters.get('from_date') or not filters.get('to_date'):
+        frappe.throw(_('Please select From Date and To Date'))
+
+    from_date = getdate(filters.from_date)
+    to_date = getdate(filters.to_date)
+
+    if from_date > to_date:
+        frappe.throw(_('From Date cannot be after To Date'))
+    if date_diff(to_date, from_date) >= MAX_RANGE_DAYS:
+        frappe.throw(_('Please select a range of at most {0} days').format(MAX_RANGE_DAYS))
+
+    date_list = [from_date + timedelta(days=i) for i in range(date_diff(to_date, from_date) + 1)]
+    daily_breakdown = filters.get('daily_breakdown')
+
+    columns = get_columns(date_list if daily_breakdown else [])
+    employees = get_employees(filters)
+
+    totals = {}
+    for employee in employees:
+        if employee.employee_no:
+            totals.setdefault(employee.employee_no, {"minutes": 0, "days": 0, "odd_days": 0, "manual": 0, "daily": {}})
+
+    def add_day(employee_no, event_date, worked_minutes, odd_punches, manual_punches):
+        total = totals.get(employee_no)
+        if total is None:
+            return
+
+        total["minutes"] += worked_minutes
+        total["days"] += 1 if worked_minutes > 0 else 0
+        total["odd_days"] += odd_punches
+        total["manual"] += manual_punches
+        if daily_breakdown and worked_minutes > 0:
+            day_key = getdate(event_date)
+            total["daily"][day_key] = total["daily"].get(day_key, 0) + worked_minutes
+
+    # Archived months come back from their files only when the range reaches them
+    archived_days = get_archived_day_punch_types(list(totals), from_date, to_date)
+
+    # Stream the stored day summaries straight off the server; only the per-employee
+    # running totals are kept in memory
+    for log in iter_day_summaries(list(totals), from_date, to_date):
+        if (str(log.employee_no), getdate(log.event_date)) in archived_days:
+            continue
+        add_day(
+            log.employee_no, log.event_date, int(log.worked_minutes or 0),
+            int(log.odd_punches or 0), int(log.manual_punch_count or 0),
+        )
+
+    if archived_days:
+        # A day back in the hot tables after its month was archived is worked out from the
+        # archived and hot punches together, the same way the monthly report does
+        add_archived_hot_punches(archived_days, list(totals))
+
+        employee_nos = {str(employee_no): employee_no for employee_no in totals}
+        for (employee_no, event_date), punch_types in archived_days.items():
+            summary = summarize_punches([seconds_to_time(seconds) for seconds in sorted(punch_types)])
+            add_day(
+                employee_nos[employee_no], event_date, summary.worked_minutes, summary.odd_punches,
+                sum(1 for punch_type in punch_types.values() if punch_type == "Manual"),
+            )
+
+    data = []
+    grand_total = {"minutes": 0, "days": 0, "odd_days": 0, "manual": 0}
+
+    for employee in employees:
+        total = totals.get(employee.employee_no) or {"minutes": 0, "days": 0, "odd_days": 0, "manual": 0, "daily": {}}
+
+        row = {
+            "employee_name": employee.employee_name,
+            "employee_id": employee.employee_no,
+            "employee_department": employee.department_name,
+            "days_present": total["days"],
+            "odd_punch_days": total["odd_days"],
+            "manual_punches": total["manual"],
+            "total_duration": format_minutes_to_hhmm(total["minutes"]),
+            "total_duration_decimal": format_decimal_hours(total["minutes"]),
+        }
+
+        if daily_breakdown:
+            for date in date_list:
+                row[f"duration_{date.strftime('%Y%m%d')}"] = format_minutes_to_hhmm(total["daily"].get(date, 0))
+
+        for key in grand_total:
+            grand_total[key] += total[key]
+
+        data.append(row)
+
+    data.append({
+        "employee_name": "Total",
+        "employee_id": len(employees),
+        "days_present": grand_total["days"],
+        "odd_punch_days": grand_total["odd_days"],
+        "manual_punches": grand_total["manual"],
+        "total_duration": format_minutes_to_hhmm(grand_total["minutes"]),
+        "total_duration_decimal": f"{grand_total['minutes'] / 60:.2f}",
+    })
+
+    return columns, data
+
+def prepare_payroll_period_report():
+    """Scheduled on the 21st: generate the 21st-to-20th payroll period that just closed."""
+    period_end = add_days(getdate(today()), -1)
+    period_start = add_days(add_months(period_end, -1), 1)
+    prepare_report_for_users("Biometric Range Report", {
+        "from_date": str(period_start),
+        "to_date": str(period_end),
+    }, view_filters=("daily_breakdown",))
+
+def get_columns(date_list):
+    columns = [
+        {"fieldname": "employee_name", "label": _("Employee Name"), "fieldtype": "Data", "width": 200, "align": "left"},
+        {"fieldname": "employee_id", "label": _("Employee ID"), "fieldtype": "Data", "width": 75, "align": "center"},
+        {"fieldname": "employee_department", "label": _("Department"), "fieldtype": "Data", "width": 100, "align": "center"},
+        {"fieldname": "days_present", "label": _("Days Present"), "fieldtype": "Int", "width": 100, "align": "center"},
+        {"fieldname": "odd_punch_days", "label": _("Odd Punch Days"), "fieldtype": "Int", "width": 110, "align": "center"},
+        {"fieldname": "manual_punches", "label": _("Manual Punches"), "fieldtype": "Int", "width": 110, "align": "center"},
+    ]
+
+    for date in date_list:
+        columns.append({
+            "fieldname": f"duration_{date.strftime('%Y%m%d')}",
+            "label": date.strftime('%d-%b'),
+            "fieldtype": "Data",
+            "width": 75,
+            "align": "center"
+        })
+
+    columns.append({"fieldname": "total_duration", "label": _("Total"), "fieldtype": "Data", "width": 100, "align": "center"})
+    columns.append({"fieldname": "total_duration_decimal", "label": _("Total Hours"), "fieldtype": "Data", "width": 100, "align": "center"})
+    return columns
+
+def get_employees(filters):
+    conditions = ""
+    if filters.get('department'):
+        conditions += " AND e.department = %(department)s"
+    if filters.get('employee'):
+        conditions += " AND e.name = %(employee)s"
+
+    employees = frappe.db.sql(f"""
+        SELECT
+            e.attendance_device_id as employee_no,
+            e.name as employee,
+            e.employee_name,
+            d.department_name
+        FROM `tabEmployee` e
+        LEFT JOIN `tabDepartment` d ON e.department = d.name
+        WHERE e.status = 'Active'
+        {conditions}
+    """, filters, as_dict=True)
+
+    # Numeric device ids in numeric order, anything else after them alphabetically
+    def natural_sort_key(emp):
+        emp_no = str(emp.employee_no or "")
+        return (0, int(emp_no), "") if emp_no.isdigit() else (1, 0, emp_no)
+
+    employees.sort(key=natural_sort_key)
+    return employees
+
+def add_archived_hot_punches(archived_days, employee_nos):
+    """Add the hot punches of archived days to their {seconds: punch type}, archived entries first."""
+    event_dates = [event_date for _, event_date in archived_days]
+    for punch in frappe.db.sql("""
+        SELECT l.employee_no, l.event_date, p.punch_time, p.punch_type
+        FROM `tabBiometric Attendance Log` l
+        INNER JOIN `tabBiometric Attendance Punch Table` p ON p.parent = l.name
+        WHERE l.event_date BETWEEN %(from_date)s AND %(to_date)s
+        AND l.employee_no IN %(employee_nos)s
+    """, {
+        "from_date": min(event_dates),
+        "to_date": max(event_dates),
+        "employee_nos": tuple(employee_nos),
+    }, as_dict=True):
+        day = archived_days.get((str(punch.employee_no), getdate(punch.event_date)))
+        if day is not None:
+            day.setdefault(time_to_seconds(punch.punch_time), punch.punch_type)
+
+def iter_day_summaries(employee_nos, from_date, to_date):
+    """Yield the stored day summary of every log in the range from an unbuffered cursor."""
+    if not employee_nos:
+        return
+
+    with frappe.db.unbuffered_cursor():
+        yield from frappe.db.sql("""
+            SELECT employee_no, event_date, worked_minutes, odd_punches, manual_punch_count
+            FROM `tabBiometric Attendance Log`
+            WHERE event_date BETWEEN %(from_date)s AND %(to_date)s
+            AND employee_no IN %(employee_nos)s
+        """, {
+            "from_date": from_date,
+            "to_date": to_date,
+            "employee_nos": tuple(employee_nos),
+        }, as_dict=True, as_iterator=True)
@@ -0,0 +1,47 @@
+# Copyright (c) 2026, NDV and contributors
+# For license information, please see license.txt
+
+"""
+Scheduled pre-generation of Prepared Reports for the people who actually open them.
+
+Frappe only serves a completed Prepared Report to its owner, so a single run as the
+scheduler's Administrator is never picked up by HR users. Instead the report is queued
+once per user who prepared it recently, as that user.
+"""
+
+import frappe
+from frappe.core.doctype.prepared_report.prepared_report import make_prepared_report
+from frappe.utils import add_days, today
+
+RECENT_REPORT_USER_DAYS = 90
+
+
+def prepare_report_for_users(report_name, filters, view_filters=()):
+    """
+    Queue a Prepared Report of `filters` for every user who prepared `report_name` in the
+    last RECENT_REPORT_USER_DAYS days.
+
+    `view_filters` names display options (e.g. a check box) carried over from each user's
+    latest run, so the stored filters match what their report view sends.
+    """
+    latest_filters = {}
+    for report in frappe.get_all(
+        "Prepared Report",
+        filters={"report_name": report_name, "creation": [">=", add_days(today(), -RECENT_REPORT_USER_DAYS)]},
+        fields=["owner", "filters"],
+        order_by="creation desc",
+    ):
+        latest_filters.setdefault(report.owner, frappe.parse_json(report.filters or "{}") or {})
+
+    session_user = frappe.session.user
+    for user, last_filters in latest_filters.items():
+        user_filters = {key: last_filters[key] for key in view_filters if last_filters.get(key)}
+        user_filters.update(filters)
+
+        try:
+            frappe.set_user(user)
+            make_prepared_report(report_name, user_filters)
+        except Exception as e:
+            frappe.log_error(f"Could not prepare {report_name} for {user}: {e!s}", "Biometric Scheduled Report")
+        finally:
+            frappe.set_user(session_user)
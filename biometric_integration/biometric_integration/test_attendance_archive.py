@@ -0,0 +1,45 @@
+# Copyright (c) 2026, NDV and Contributors
+# See license.txt
+
+import unittest
+
+from biometric_integration.biometric_integration.attendance_archive import _merge_rows
+
+
+def log_row(employee_no, event_date, *punches, employee_name="Asha"):
+	return {
+		"employee_no": employee_no,
+		"employee_name": employee_name,
+		"event_date": event_date,
+		"punches": [[punch, "Auto"] for punch in punches],
+	}
+
+
+class TestMergeRows(unittest.TestCase):
+	def test_summarizes_and_sorts(self):
+		merged = _merge_rows([], [
+			log_row("2", "2026-03-02", "09:00:00", "13:30:00"),
+			log_row("1", "2026-03-02", "17:00:00", "09:00:00", "13:00:00"),
+			log_row("1", "2026-03-01", "09:00:00", "17:00:00"),
+		])
+		self.assertEqual(
+			[(row["event_date"], row["employee_no"]) for row in merged],
+			[("2026-03-01", "1"), ("2026-03-02", "1"), ("2026-03-02", "2")],
+		)
+		self.assertEqual([punch[0] for punch in merged[1]["punches"]], ["09:00:00", "13:00:00", "17:00:00"])
+		self.assertEqual(merged[1]["odd_punches"], 1)
+		self.assertEqual(merged[0]["worked_minutes"], 480)
+		self.assertEqual(merged[2]["worked_minutes"], 270)
+
+	def test_day_split_across_parts(self):
+		# Punches synced after the month was archived land in a later part
+		first = _merge_rows([], [log_row("1", "2026-03-02", "09:00:00", "12:00:00", employee_name="")])
+		merged = _merge_rows(first, [log_row("1", "2026-03-02", "12:00:00", "13:00:00", "18:00:00")])
+
+		self.assertEqual(len(merged), 1)
+		self.assertEqual(
+			[punch[0] for punch in merged[0]["punches"]], ["09:00:00", "12:00:00", "13:00:00", "18:00:00"]
+		)
+		self.assertEqual(merged[0]["worked_minutes"], 480)
+		self.assertEqual(merged[0]["odd_punches"], 0)
+		self.assertEqual(merged[0]["employee_name"], "Asha")
@@ -0,0 +1,100 @@
+# Copyright (c) 2026, NDV and Contributors
+# See license.txt
+
+import unittest
+from datetime import time, timedelta
+
+from biometric_integration.biometric_integration.attendance_compute import (
+	PunchDays,
+	format_decimal_hours,
+	format_minutes_to_hhmm,
+	punch_idx_shifts,
+	punch_insert_idx,
+	summarize_punches,
+)
+
+
+def apply_punch_insert(existing, added, existing_idx=None):
+	"""Punch seconds ordered by idx after the shifts and inserts bulk_add_punches runs."""
+	idx = dict(zip(existing, existing_idx or range(1, len(existing) + 1), strict=True))
+	for shift in punch_idx_shifts(existing, added):
+		# UPDATE ... SET idx = idx + 1 WHERE punch_time > shift, on the existing rows
+		for seconds in existing:
+			if seconds > shift:
+				idx[seconds] += 1
+	idx.update(zip(added, punch_insert_idx(existing, added, existing_idx), strict=True))
+	return [seconds for seconds, _ in sorted(idx.items(), key=lambda item: item[1])], sorted(idx.values())
+
+
+class TestPunchDays(unittest.TestCase):
+	def test_pairs_and_first_last(self):
+		summary = summarize_punches([time(9, 0), time(13, 0), "14:00:00", timedelta(hours=18, minutes=30)])
+		self.assertEqual(summary.worked_minutes, 4 * 60 + 4 * 60 + 30)
+		self.assertEqual(summary.punch_count, 4)
+		self.assertEqual(summary.odd_punches, 0)
+		self.assertEqual(summary.first_punch, 9 * 3600)
+		self.assertEqual(summary.last_punch, 18 * 3600 + 30 * 60)
+
+	def test_trailing_odd_punch_is_flagged_and_left_out(self):
+		summary = summarize_punches([time(9, 0), time(17, 0), time(18, 0)])
+		self.assertEqual(summary.worked_minutes, 8 * 60)
+		self.assertEqual(summary.odd_punches, 1)
+		self.assertEqual(summary.last_punch, 18 * 3600)
+
+	def test_whole_minute_differences(self):
+		# 09:00:59 -> 09:01:00 counts as one minute, like the monthly report always did
+		summary = summarize_punches([time(9, 0, 59), time(9, 1, 0)])
+		self.assertEqual(summary.worked_minutes, 1)
+
+	def test_empty_day(self):
+		summary = summarize_punches([])
+		self.assertEqual((summary.worked_minutes, summary.punch_count, summary.odd_punches), (0, 0, 0))
+		self.assertIsNone(summary.first_punch)
+		self.assertIsNone(summary.last_punch)
+
+	def test_from_rows_splits_days_by_key(self):
+		rows = [
+			{"parent": "A", "punch_time": time(9, 0)},
+			{"parent": "A", "punch_time": time(17, 0)},
+			{"parent": "B", "punch_time": time(10, 0)},
+		]
+		days = PunchDays.from_rows(rows, key=lambda row: row["parent"])
+		days.add_day("C", [])
+		summaries = days.summaries()
+
+		self.assertEqual(summaries["A"].worked_minutes, 8 * 60)
+		self.assertEqual(summaries["B"].odd_punches, 1)
+		self.assertEqual(summaries["B"].worked_minutes, 0)
+		self.assertEqual(summaries["C"].punch_count, 0)
+
+	def test_formatting(self):
+		self.assertEqual(format_minutes_to_hhmm(8 * 60 + 5), "08:05")
+		self.assertEqual(format_decimal_hours(90), "1.5000")
+
+
+class TestPunchIdx(unittest.TestCase):
+	def test_append_touches_no_existing_row(self):
+		existing = [9 * 3600, 13 * 3600]
+		added = [17 * 3600, 18 * 3600]
+		self.assertEqual(punch_idx_shifts(existing, added), [])
+		self.assertEqual(punch_insert_idx(existing, added), [3, 4])
+
+	def test_out_of_order_insert_keeps_time_order(self):
+		existing = [10, 20, 30]
+		added = [5, 15, 25, 35]
+		order, idx = apply_punch_insert(existing, added)
+		self.assertEqual(order, [5, 10, 15, 20, 25, 30, 35])
+		self.assertEqual(idx, list(range(1, 8)))
+
+	def test_insert_into_empty_day(self):
+		self.assertEqual(punch_idx_shifts([], [10, 20]), [])
+		self.assertEqual(punch_insert_idx([], [10, 20]), [1, 2])
+
+	def test_insert_after_deleted_rows(self):
+		# 20 and 40 were deleted, leaving idx 1, 3, 5
+		existing, existing_idx = [10, 30, 50], [1, 3, 5]
+		for added in ([60], [5, 15], [25, 35, 55], [5, 11, 29, 31, 60]):
+			order, idx = apply_punch_insert(existing, added, existing_idx)
+			self.assertEqual(order, sorted(existing + added))
+			self.assertEqual(len(set(idx)), len(idx))
+		self.assertEqual(punch_insert_idx(existing, [60], existing_idx), [6])
@@ -0,0 +1,39 @@
+# Copyright (c) 2026, NDV and Contributors
+# See license.txt
+
+import unittest
+
+from biometric_integration.biometric_integration.event_push import normalize_event
+
+
+def pushed_event(**event):
+	return {
+		"dateTime": "2026-03-02T08:01:12+05:30",
+		"eventType": "AccessControllerEvent",
+		"AccessControllerEvent": {"majorEventType": 5, "subEventType": 75, "name": "Asha", **event},
+	}
+
+
+class TestNormalizeEvent(unittest.TestCase):
+	def test_access_event(self):
+		self.assertEqual(normalize_event(pushed_event(employeeNoString="1007", serialNo=42)), {
+			"employeeNoString": "1007",
+			"name": "Asha",
+			"time": "2026-03-02T08:01:12+05:30",
+			"serialNo": 42,
+		})
+
+	def test_numeric_employee_no(self):
+		# Older firmware only sends employeeNo as a number
+		self.assertEqual(normalize_event(pushed_event(employeeNo=1007))["employeeNoString"], "1007")
+
+	def test_other_events_dropped(self):
+		self.assertIsNone(normalize_event(pushed_event(employeeNoString="1007", subEventType=76)))
+		self.assertIsNone(normalize_event(pushed_event(employeeNoString="1007", majorEventType=3)))
+		self.assertIsNone(normalize_event({"eventType": "heartBeat", "dateTime": "2026-03-02T08:01:12+05:30"}))
+
+	def test_incomplete_events_dropped(self):
+		self.assertIsNone(normalize_event(pushed_event()))
+		payload = pushed_event(employeeNoString="1007")
+		del payload["dateTime"]
+		self.assertIsNone(normalize_event(payload))
@@ -157,9 +157,21 @@ scheduler_events = {
     "cron": {
         "15 8 * * 0-2,4-6": [
             "biometric_integration.biometric_integration.doctype.biometric_integration_settings.biometric_integration_settings.scheduled_attendance_sync"
+        ],
+        "* * * * *": [
+            "biometric_integration.biometric_integration.event_push.flush_pushed_events"
+        ],
+        "0 2 1 * *": [
+            "biometric_integration.biometric_integration.report.biometric_monthly_report.biometric_monthly_report.prepare_previous_month_report"
+        ],
+        "0 2 21 * *": [
+            "biometric_integration.biometric_integration.report.biometric_range_report.biometric_range_report.prepare_payroll_period_report"
         ]
     },
-    "weekly": [
+    "hourly_long": [
+        "biometric_integration.biometric_integration.doctype.biometric_integration_settings.biometric_integration_settings.reconcile_manual_punches"
+    ],
+    "weekly_long": [
         "biometric_integration.biometric_integration.doctype.biometric_attendance_log.biometric_attendance_log.delete_old_attendance_logs"
     ]
 # 	"all": [
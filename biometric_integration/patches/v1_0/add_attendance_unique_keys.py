@@ -0,0 +1,17 @@
+from biometric_integration.biometric_integration.doctype.biometric_attendance_log import (
+    biometric_attendance_log,
+)
+from biometric_integration.biometric_integration.doctype.biometric_attendance_punch_table import (
+    biometric_attendance_punch_table,
+)
+
+
+def execute():
+    """
+    Create the attendance unique keys and indexes on existing sites.
+
+    Migrate only runs on_doctype_update for doctypes whose JSON changed, which the punch
+    table's did not; duplicates were already merged by merge_duplicate_attendance_logs.
+    """
+    biometric_attendance_log.on_doctype_update()
+    biometric_attendance_punch_table.on_doctype_update()
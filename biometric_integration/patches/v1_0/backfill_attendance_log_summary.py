@@ -0,0 +1,16 @@
+import frappe
+
+from biometric_integration.biometric_integration.doctype.biometric_attendance_log.biometric_attendance_log import (
+    refresh_total_hours,
+)
+
+BATCH_SIZE = 1000
+
+
+def execute():
+    """Fill the day summary fields of existing attendance logs."""
+    log_names = frappe.get_all("Biometric Attendance Log", pluck="name", order_by="name")
+
+    for start in range(0, len(log_names), BATCH_SIZE):
+        refresh_total_hours(log_names[start:start + BATCH_SIZE])
+        frappe.db.commit()
@@ -0,0 +1,82 @@
+import frappe
+
+
+def execute():
+    """
+    Clear the duplicates that would block the unique keys on (employee_no, event_date)
+    and (parent, punch_time): later logs of the same day are folded into the first one and
+    repeated punch times within a log are dropped.
+    """
+    if not frappe.db.table_exists("Biometric Attendance Log"):
+        return
+
+    touched = set()
+
+    for group in frappe.db.sql("""
+        SELECT employee_no, event_date
+        FROM `tabBiometric Attendance Log`
+        GROUP BY employee_no, event_date
+        HAVING COUNT(*) > 1
+    """, as_dict=True):
+        logs = frappe.db.sql("""
+            SELECT name, employee_name
+            FROM `tabBiometric Attendance Log`
+            WHERE employee_no = %s AND event_date = %s
+            ORDER BY creation, name
+        """, (group.employee_no, group.event_date), as_dict=True)
+
+        keep, duplicates = logs[0], [log.name for log in logs[1:]]
+
+        frappe.db.sql("""
+            UPDATE `tabBiometric Attendance Punch Table`
+            SET parent = %(keep)s
+            WHERE parent IN %(duplicates)s AND parenttype = 'Biometric Attendance Log'
+        """, {"keep": keep.name, "duplicates": tuple(duplicates)})
+
+        if not keep.employee_name:
+            employee_name = next((log.employee_name for log in logs if log.employee_name), None)
+            if employee_name:
+                frappe.db.set_value(
+                    "Biometric Attendance Log", keep.name, "employee_name", employee_name, update_modified=False
+                )
+
+        frappe.db.sql("""
+            DELETE FROM `tabBiometric Attendance Log`
+            WHERE name IN %(duplicates)s
+        """, {"duplicates": tuple(duplicates)})
+
+        touched.add(keep.name)
+
+    duplicate_punches = frappe.db.sql("""
+        SELECT later.name, later.parent
+        FROM `tabBiometric Attendance Punch Table` later
+        JOIN `tabBiometric Attendance Punch Table` earlier
+            ON earlier.parent = later.parent
+            AND earlier.punch_time = later.punch_time
+            AND (earlier.idx < later.idx OR (earlier.idx = later.idx AND earlier.name < later.name))
+    """, as_dict=True)
+
+    if duplicate_punches:
+        frappe.db.sql("""
+            DELETE FROM `tabBiometric Attendance Punch Table`
+            WHERE name IN %(names)s
+        """, {"names": tuple({punch.name for punch in duplicate_punches})})
+        touched.update(punch.parent for punch in duplicate_punches)
+
+    if not touched:
+        return
+
+    # Renumber the merged punch tables in time order
+    idx_by_parent = {}
+    for punch in frappe.db.sql("""
+        SELECT name, parent
+        FROM `tabBiometric Attendance Punch Table`
+        WHERE parent IN %(parents)s
+        ORDER BY parent, punch_time
+    """, {"parents": tuple(touched)}, as_dict=True):
+        idx_by_parent[punch.parent] = idx_by_parent.get(punch.parent, 0) + 1
+        frappe.db.set_value(
+            "Biometric Attendance Punch Table", punch.name, "idx", idx_by_parent[punch.parent], update_modified=False
+        )
+
+    # Total hours and the day summary of merged logs are recomputed by the post-sync backfill